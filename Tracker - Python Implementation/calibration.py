@@ -158,6 +158,27 @@ def create_interpolation_map(calibration_data):
 
 
 
+def angle_uncertainty(calibration_data):
+    """
+    Estimates the angle uncertainty (in degrees) of the calibration from the scatter of the
+    clicked marks around the fitted hoop circle: a click error of sigma pixels along the hoop
+    is an angle error of sigma/R radians.
+    """
+    points = np.array(list(calibration_data.values()), dtype=float)
+    x = points[:, 0]
+    y = points[:, 1]
+
+    def f_2(c):
+        Ri = np.sqrt((x - c[0])**2 + (y - c[1])**2)
+        return Ri - Ri.mean()
+
+    center_fit, _ = optimize.leastsq(f_2, (np.mean(x), np.mean(y)))
+    residuals = f_2(center_fit)
+    radius = np.mean(np.sqrt((x - center_fit[0])**2 + (y - center_fit[1])**2))
+    return float(np.rad2deg(np.std(residuals) / radius))
+
+
+
 def save_calibration(calibration_data):
     """Saves the calibration dictionary to a timestamped JSON file."""
     folder = "calibration_data"
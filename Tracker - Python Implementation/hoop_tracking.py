@@ -73,6 +73,7 @@ def get_angular_velocity(cap, fps):
     print("Tracking active... Press 'q' to stop early and calculate.")
 
     lap_times = []
+    lap_marks = [start_frame_idx / fps]  # video time (sec) of every tripwire crossing
     last_lap_frame = start_frame_idx
     current_frame_idx = start_frame_idx
     
@@ -113,6 +114,7 @@ def get_angular_velocity(cap, fps):
                 lap_frames = current_frame_idx - last_lap_frame
                 lap_time = lap_frames / fps
                 lap_times.append(lap_time)
+                lap_marks.append(current_frame_idx / fps)
                 
                 print(f"Lap marked! Time: {lap_time:.3f} sec")
                 last_lap_frame = current_frame_idx
@@ -164,4 +166,5 @@ def get_angular_velocity(cap, fps):
     
     # We return the mean omega for the final physics calculations, 
     # but you could easily change this to return the median_omega if you prefer!
-    return {"mean_omega": mean_omega, "error_omega": std_omega}
\ No newline at end of file
+    # lap_marks give the drift of omega over the run (time_evolution.drive_profile_from_laps)
+    return {"mean_omega": mean_omega, "error_omega": std_omega, "lap_marks": np.array(lap_marks)}
\ No newline at end of file
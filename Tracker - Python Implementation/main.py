@@ -54,6 +54,7 @@ def main():
     # Proceed with interpolation mapping and visualization if we successfully got data
     if calibration_data:
         angle_calculator = calibration.create_interpolation_map(calibration_data)
+        print(f"Calibration angle uncertainty: {calibration.angle_uncertainty(calibration_data):.2f} deg")
         
         # --- Phase 1.4: Visualization Sanity Check ---
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -81,6 +82,9 @@ def main():
                 f.write(f"Angular Velocity : {hoop_tracking_out['mean_omega']:.3f} \n")
                 f.write(f"Error : {hoop_tracking_out['error_omega']:.3f} \n")
             print(f"Angular velocity saved to {filename}")
+            filename = os.path.join(output_dir, "lap_marks_" + os.path.basename(video_path).split('.')[0] + ".txt")
+            np.savetxt(filename, hoop_tracking_out['lap_marks'], header="Lap_Mark_Time_s")
+            print(f"Lap marks saved to {filename}")
 
 
         t_data, theta_data = bead_tracking.track_bead(cap, fps, angle_calculator, calibration_data)
@@ -1,44 +1,63 @@
 #!/usr/bin/env python
-import h5py
 import numpy as np
 import matplotlib.pyplot as plt
+from trajectory_store import select
+from features import load_features
+import harmonic_balance
 
 plots_dir = "Plots/amplitude/"
+data_file_path = "Data/dissip_trajectories.h5"
 
 #alphas_deg = range(0, 20, 1)
 alphas_deg = [22]
+gammas = [0.5]  # Any damping values of the scan, drawn in one figure
+colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
 
-with h5py.File("Data/dissip_trajectories.h5", "r") as file:
-    for alpha in alphas_deg:
-        alpha_grp = file[f"alpha{alpha:05.2f}"]
-        omegas = list()
-        amplitudes = list()
-        for omega_val in np.arange(1,6,0.02): 
-            omega_grp = alpha_grp[f"omega{omega_val:06.3f}"]
-            omega = omega_grp.attrs["omega"]
-            trjy_grp = omega_grp["uniform30.0_00.0_0.5"]
-            theta0 = trjy_grp.attrs["theta0"]
-            thetadot0 = trjy_grp.attrs["thetadot0"]
-            theta = (trjy_grp["theta"][:] + np.pi) % (2*np.pi) - np.pi  #  Plotting theta in the range -pi to pi
-            amplitude = np.max(theta) - np.min(theta)
-            omegas.append(omega)
-            amplitudes.append(amplitude)
+# Read only: the features are written by features.py, never while a scan holds the file
+features = load_features(data_file_path)
+if features is None:
+    raise SystemExit(f"No up to date features table in {data_file_path}. Run: python features.py {data_file_path}")
 
+for alpha in alphas_deg:
+    # One pass over the features table, one curve per gamma
+    rows = features[
+            select(features["alpha"], alpha)
+            & select(features["omega"], (1, 5.98))
+            & select(features["theta0"], 30.0)
+            & select(features["thetadot0"], 0.0)
+            & select(features["gamma"], list(gammas))
+            ]
+    if len(rows) == 0:
+        continue
+    theta0 = np.deg2rad(rows["theta0"][0])
+    thetadot0 = rows["thetadot0"][0]
 
-        plt.figure()
-        plt.plot(omegas, amplitudes, color="black")
-        plt.xlabel(r"$\omega\,(rad/s)$")
-        plt.ylabel(r"$A=\theta_\max-\theta_\min$")
-        plt.ylim(-0.25, 2*np.pi+0.25)
-        plt.title(
-                  "Amplitude"" vs. " r"$\omega$"
-                  #"\n" rf"$\alpha={alpha:05.2f}^\circ,\,gamma={init_grp.attrs['gamma']}$"
-                  "\n" rf"$\alpha={alpha:05.2f}^\circ\quad \gamma=0.5$"
-                  "\n" rf"$\theta_0={np.rad2deg(theta0):.2f}^\circ,\, \dot\theta_0={thetadot0}$"
-                  )
+    plt.figure()
+    for color, gamma in zip(colors, gammas):
+        curve = rows[select(rows["gamma"], gamma)]
+        if len(curve) == 0:
+            continue
+        curve = curve[np.argsort(curve["omega"])]
+        plt.plot(curve["omega"], curve["amplitude"], color=color, label=rf"$\gamma={gamma}$")
 
-        file_name = f"{plots_dir}{alpha:05.2f}.jpg"
-        #plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
-        print(file_name)
-        plt.show()
-        plt.close()
+        # Period-1 solutions by harmonic balance, all branches of the resonance curve
+        periodic = harmonic_balance.resonance_curves(np.arange(1, 6, 0.02), np.deg2rad(alpha), gamma=gamma)
+        plt.scatter(periodic["omega"][periodic["stable"]], periodic["amplitude"][periodic["stable"]],
+                    s=3, color=color, zorder=3)
+        plt.scatter(periodic["omega"][~periodic["stable"]], periodic["amplitude"][~periodic["stable"]],
+                    s=1, color=color, marker="x", alpha=0.5, zorder=3)
+    plt.legend(fontsize="small", title="harmonic balance: dots stable, x unstable", title_fontsize="x-small")
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel(r"$A=\theta_\max-\theta_\min$")
+    plt.ylim(-0.25, 2*np.pi+0.25)
+    plt.title(
+              "Amplitude"" vs. " r"$\omega$"
+              "\n" rf"$\alpha={alpha:05.2f}^\circ$"
+              "\n" rf"$\theta_0={np.rad2deg(theta0):.2f}^\circ,\, \dot\theta_0={thetadot0}$"
+              )
+
+    file_name = f"{plots_dir}{alpha:05.2f}.jpg"
+    #plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+    print(file_name)
+    plt.show()
+    plt.close()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Parallel batch generation of figures from a trajectory file.
+
+A plot script describes every figure as a job (output file name, the
+trajectory groups it reads and its plotting parameters) and a module level
+plotting function
+
+    def plot_something(store, file_name, **params): ...
+
+that draws the figure from a TrajectoryStore and saves it to file_name.
+`run_jobs` fans the jobs out to a process pool. Every worker uses the
+non-interactive Agg backend and opens the data file read-only once (SWMR, so
+it also works while a scan is writing).
+
+Figures are only regenerated when something they depend on changed. The
+manifest (a JSON file next to the plots) stores a hash per figure of
+- the plotting parameters and the source code of the plotting function
+- the source trajectories: their attributes, shape and first and last drive period
+Jobs whose hash matches the manifest and whose file exists are skipped.
+"""
+from collections import Counter
+from multiprocessing import Pool
+import hashlib
+import inspect
+import json
+import os
+import signal
+import numpy as np
+from tqdm import tqdm
+from trajectory_store import TrajectoryStore, TrajectoryView
+
+_store = None
+
+
+def init_worker(data_file_path, swmr):
+    global _store
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import matplotlib
+    matplotlib.use("Agg")
+    _store = TrajectoryStore(data_file_path, swmr=swmr)
+
+
+def run_job(args):
+    plot_function, file_name, params = args
+    import matplotlib.pyplot as plt
+    plot_function(_store, file_name, **params)
+    plt.close("all")
+    return file_name
+
+
+def source_fingerprint(store, paths):
+    """
+    Cheap fingerprint of the source trajectories: attributes, dataset shapes and
+    the first and last drive period of theta (two chunks at most).
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        view = TrajectoryView(store, path)
+        h.update(path.encode())
+        h.update(repr(sorted((k, repr(v)) for k,v in view.attrs.items())).encode())
+        theta = view.group["theta"]
+        if store.swmr:
+            theta.refresh()
+        h.update(repr(theta.shape).encode())
+        samples = view.samples_per_period
+        h.update(np.ascontiguousarray(theta[:samples]).tobytes())
+        h.update(np.ascontiguousarray(theta[-samples:]).tobytes())
+    return h.hexdigest()
+
+
+def job_hash(plot_function, params, fingerprint):
+    h = hashlib.sha1()
+    h.update(f"{plot_function.__module__}.{plot_function.__qualname__}".encode())
+    h.update(inspect.getsource(plot_function).encode())
+    h.update(json.dumps(params, sort_keys=True, default=repr).encode())
+    h.update(fingerprint.encode())
+    return h.hexdigest()
+
+
+def load_manifest(manifest_path):
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return dict()
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def run_jobs(plot_function, jobs, data_file_path, manifest_path, processes=None, swmr=True, force=False):
+    """
+    Draws the figures of jobs in parallel, skipping the unchanged ones.
+    plot_function: module level function plot_function(store, file_name, **params)
+    jobs: list of dictionaries with keys
+          "file_name": output figure
+          "sources": paths of the trajectory groups the figure is drawn from
+          "params": keyword arguments of plot_function (JSON serialisable)
+    manifest_path: JSON file of figure hashes
+    force: redraw every figure
+    Returns the list of figures drawn.
+    """
+    duplicates = sorted(name for name, count in Counter(job["file_name"] for job in jobs).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Several jobs draw the same figure: {duplicates}")
+    manifest = load_manifest(manifest_path)
+
+    todo = list()
+    with TrajectoryStore(data_file_path, cache_bytes=0, swmr=swmr) as store:
+        for job in jobs:
+            digest = job_hash(plot_function, job["params"], source_fingerprint(store, job["sources"]))
+            if not force and manifest.get(job["file_name"]) == digest and os.path.isfile(job["file_name"]):
+                continue
+            todo.append((job, digest))
+    print(f"{len(todo)} of {len(jobs)} figures to draw ({len(jobs) - len(todo)} unchanged)")
+    if not todo:
+        return list()
+
+    for job, _ in todo:
+        directory = os.path.dirname(job["file_name"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    digests = {job["file_name"]: digest for job, digest in todo}
+    drawn = list()
+    pool = Pool(processes=processes or max(os.cpu_count(),1), initializer=init_worker, initargs=(data_file_path, swmr))
+    try:
+        for file_name in tqdm(
+                pool.imap_unordered(run_job, [(plot_function, job["file_name"], job["params"]) for job, _ in todo]),
+                total=len(todo),
+                desc="Drawing figures"
+                ):
+            manifest[file_name] = digests[file_name]
+            drawn.append(file_name)
+        pool.close()
+        pool.join()
+    except KeyboardInterrupt:
+        print("\nInterrupted by user. Terminating workers...")
+        pool.terminate()
+        pool.join()
+    finally:
+        save_manifest(manifest, manifest_path)  # Keep the figures finished so far
+    return drawn
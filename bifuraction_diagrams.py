@@ -6,7 +6,6 @@
 '''
 
 import numpy as np
-from scipy.optimize import root_scalar
 import matplotlib.pyplot as plt
         
 
@@ -35,96 +34,285 @@ def classify_root(theta_star, omega, t, b=0, g=1, alpha=0):
     else:
         return "unstable"
     
+def find_fixed_points(omega, t, g=1, alpha=0, n_points=1500, tol=1e-12, max_iter=60):
+    """
+    All roots of f in [-pi, pi] for a whole array of parameter values at once.
+    omega, t, g, alpha: scalars or arrays broadcast to a common 1D shape (n_params,)
+    Every sign change of f on the (n_params, n_points) grid brackets a root, which is
+    refined for all brackets together by Newton steps (with f_theta), falling back to
+    bisection whenever a step would leave its bracket.
+    Returns (index, theta_star, f_theta at theta_star), index being the parameter
+    index of each root.
+    """
+    omega, t, g, alpha = (np.ravel(p) for p in np.broadcast_arrays(omega, t, g, alpha))
+    thetas = np.linspace(-np.pi, np.pi, n_points)
+    values = f(thetas[None, :], omega[:, None], t[:, None], g[:, None], alpha[:, None])
+
+    # Roots on grid points and brackets of sign changes
+    on_grid = np.nonzero(values == 0)
+    brackets = np.nonzero(values[:, :-1]*values[:, 1:] < 0)
+    idx = brackets[0]
+    lo = thetas[brackets[1]]
+    hi = thetas[brackets[1] + 1]
+    f_lo = values[brackets]
+    args = (omega[idx], t[idx], g[idx], alpha[idx])
+
+    x = (lo + hi)/2
+    for _ in range(max_iter):
+        fx = f(x, *args)
+        left = np.sign(fx) == np.sign(f_lo)  # The root is to the right of x
+        lo = np.where(left, x, lo)
+        f_lo = np.where(left, fx, f_lo)
+        hi = np.where(left, hi, x)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_newton = x - fx/f_theta(x, *args)
+        inside = (x_newton > lo) & (x_newton < hi)
+        x_new = np.where(inside, x_newton, (lo + hi)/2)
+        converged = np.abs(x_new - x) < tol
+        x = x_new
+        if np.all(converged):
+            break
+
+    idx = np.concatenate((on_grid[0], idx))
+    roots = np.concatenate((thetas[on_grid[1]], x))
+
+    # Remove duplicates, sorted by parameter index and theta
+    idx, roots = np.unique(np.stack((idx, np.round(roots, 6) + 0.0), axis=1), axis=0).T
+    idx = idx.astype(int)
+    return idx, roots, f_theta(roots, omega[idx], t[idx], g[idx], alpha[idx])
+
+
+def stability(d, b=0):
+    """Vectorized classify_root: labels from the values d of f_theta at the roots."""
+    return np.where(d > 0, "stable" if b > 0 else "center", "unstable")
+
+
 def find_all_roots_with_stability(omega, t, b=0, g=1, alpha=0, n_points=1500):
+    _, roots, d = find_fixed_points(omega, t, g, alpha, n_points)
+    return list(zip(roots, stability(d, b)))
+
+
+# ----- Continuation of fixed-point branches -----
+def f_param(theta, omega, t, g, alpha, param):
+    """Partial derivative of f with respect to param ("omega", "alpha" or "t")."""
+    if param == "omega":
+        return (-2*omega*np.cos(theta)*np.sin(theta)
+                + g*np.sin(alpha)*t*np.sin(omega*t)*np.cos(theta))
+    if param == "alpha":
+        return (-np.sin(alpha)*g*np.sin(theta)
+                - g*np.cos(alpha)*np.cos(omega*t)*np.cos(theta))
+    if param == "t":
+        return g*np.sin(alpha)*omega*np.sin(omega*t)*np.cos(theta)
+    raise ValueError(f"Unknown continuation parameter {param!r}. Use 'omega', 'alpha' or 't'")
+
+
+def wrap(theta):
+    """theta wrapped to [-pi, pi)."""
+    return (theta + np.pi) % (2*np.pi) - np.pi
+
+
+branch_dtype = np.dtype([("param", float), ("theta", float), ("f_theta", float)])
+bifurcation_dtype = np.dtype([("param", float), ("theta", float), ("kind", object)])
 
-    thetas = np.linspace(-np.pi, np.pi, n_points)
-    values = f(thetas, omega, t, g, alpha)
 
-    roots = []
+def trace_branches(param, param_range, omega=1, t=0, g=1, alpha=0, n_seeds=50,
+                   ds=0.02, ds_max=0.1, tol=1e-10, max_steps=20000):
+    """
+    Traces every fixed-point branch of f in the (param, theta) plane by
+    pseudo-arclength continuation: tangent predictor, Newton corrector on
+    f = 0 plus the arclength constraint, with f_theta and f_param as Jacobian.
+    param: the varied parameter, "omega", "alpha" or "t"; the others stay fixed
+    param_range: (start, stop)
+    n_seeds: the branches are started from the roots found by find_fixed_points at
+             n_seeds parameter values, so that branches which do not reach the ends
+             of the range (e.g. born in a saddle-node) are found too
+    ds, ds_max: initial and maximum step, in units where param_range spans 2*pi
+    theta is periodic: a branch is continued through theta = +-pi, not cut there.
+    Returns (branches, bifurcations):
+    branches: list of branch_dtype arrays, ordered along each branch, theta wrapped to [-pi, pi)
+    bifurcations: bifurcation_dtype array of the points where f_theta changes sign,
+                  kind "saddle-node" if the branch turns back in param, "pitchfork" otherwise
+    """
+    p_start, p_stop = param_range
+    scale = (p_stop - p_start)/(2*np.pi)  # param = p_start + scale*u, u in [0, 2 pi]
+    fixed = {"omega": omega, "t": t, "g": g, "alpha": alpha}
+    if param not in ("omega", "alpha", "t"):
+        raise ValueError(f"Unknown continuation parameter {param!r}. Use 'omega', 'alpha' or 't'")
 
-    for i in range(len(thetas)-1):
-        if values[i] == 0:
-            roots.append(thetas[i])
-        elif values[i]*values[i+1] < 0:
+    def evaluate(x):
+        # f, f_u and f_theta at x = (u, theta)
+        args = {**fixed, param: p_start + scale*x[0]}
+        return (f(x[1], **args), scale*f_param(x[1], **args, param=param), f_theta(x[1], **args))
+
+    def tangent(x, previous=None):
+        _, f_u, f_th = evaluate(x)
+        T = np.array([f_th, -f_u])
+        T /= np.linalg.norm(T)
+        if previous is not None and T @ previous < 0:
+            T = -T
+        return T
+
+    def correct(y, row, target):
+        # Newton on f = 0 plus the linear constraint row @ y = target
+        for _ in range(10):
+            F, f_u, f_th = evaluate(y)
             try:
-                sol = root_scalar(
-                    f,
-                    args=(omega, t, g, alpha),
-                    bracket=[thetas[i], thetas[i+1]],
-                    method='brentq'
-                )
+                delta = np.linalg.solve([[f_u, f_th], row], [F, row @ y - target])
+            except np.linalg.LinAlgError:
+                return None
+            y = y - delta
+            if np.max(np.abs(delta)) < tol:
+                return y
+        return None
 
-                r = np.round(sol.root, 6)
-                stab = classify_root(r, omega, t, b, g, alpha)
+    def inside(x):
+        return 0 <= x[0] <= 2*np.pi
 
-                roots.append((r, stab))
+    def offset(x, y):
+        # y - x with the theta difference wrapped to [-pi, pi)
+        return np.array([y[0] - x[0], wrap(y[1] - x[1])])
 
-            except:
-                pass
+    def to_edge(x, y):
+        # Point of the branch on the edge of the param range crossed between x and y
+        for bound in (0, 2*np.pi):
+            if (y[0] - bound)*(x[0] - bound) < 0:
+                row = np.array([1.0, 0.0])
+                edge = correct(x + (bound - x[0])/(y[0] - x[0])*(y - x), row, bound)
+                if (edge is not None and inside(edge + 1e-12*(x - edge))
+                        and np.linalg.norm(edge - x) <= np.linalg.norm(y - x)):
+                    return edge
+        return None
 
-    # remove duplicates
-    unique = {}
-    for r, s in roots:
-        unique[r] = s
+    def trace(x0, direction):
+        points = [x0]
+        T = tangent(x0)
+        if T[0]*direction < 0 or (T[0] == 0 and direction < 0):
+            T = -T
+        tangents = [T]
+        h = ds
+        closed = False
+        while len(points) < max_steps and h > 1e-8:
+            x = points[-1]
+            y = correct(x + h*T, T, T @ x + h)
+            if y is None or np.linalg.norm(y - x) > 2*h:
+                h /= 2  # Corrector failed or jumped to another branch, retry with a smaller step
+                continue
 
-    return [(r, unique[r]) for r in sorted(unique)]
+            if not inside(y):
+                edge = to_edge(x, y)
+                if edge is not None:
+                    points.append(edge)
+                    tangents.append(tangent(edge, T))
+                break
+            T = tangent(y, T)
+            points.append(y)
+            tangents.append(T)
+            if len(points) > 3 and np.linalg.norm(offset(x0, y)) < h:
+                points.append(y - offset(x0, y))  # Back at the start (mod 2 pi), a closed branch
+                tangents.append(tangents[0])
+                closed = True
+                break
+            h = min(1.5*h, ds_max)
+        return np.array(points), np.array(tangents), closed
 
-def plot_bifurcation_omega(omega_range, t, alpha, g =1, b=0):
-    bifurcation_data = []
+    def locate(a, b):
+        # Bisection for the sign change of f_theta on the branch between points a and b
+        chord = (b - a)/np.linalg.norm(b - a)
+        d_a = evaluate(a)[2]
+        for _ in range(40):
+            m = correct((a + b)/2, chord, chord @ (a + b)/2)
+            if m is None:
+                break
+            if evaluate(m)[2]*d_a > 0:
+                a = m
+            else:
+                b = m
+        return (a + b)/2
 
-    for omega in omega_range:
-        roots = find_all_roots_with_stability(omega, t, b, g, alpha)
-        for r, s in roots:
-            bifurcation_data.append((omega, r, s))
-    bifurcation_data = np.array(bifurcation_data)
+    # Seeds
+    seeds_p = np.linspace(p_start, p_stop, n_seeds)
+    idx, roots, _ = find_fixed_points(**{**fixed, param: seeds_p})
+    seeds = [correct(x, np.array([1.0, 0.0]), x[0]) for x in np.stack(((seeds_p[idx] - p_start)/scale, roots), axis=1)]
 
-    plt.figure(figsize=(10, 6))
-    for omega, r, s in bifurcation_data:
-        color = 'blue' if s == 'stable' else 'red' if s == 'unstable' else 'green'
-        plt.scatter(omega, r, color=color, s=10)
-    plt.xlabel(r'$\omega$')
-    plt.ylabel(r'$\theta^*$')
-    plt.title('Bifurcation Diagram: Fixed Points vs Driving Frequency')
-    plt.grid()
-    plt.show()
+    curves = list()
+    for x0 in seeds:
+        if x0 is None or any(min(np.linalg.norm(offset(x0, x)) for x in curve) < 2*ds_max for curve, _ in curves):
+            continue  # On a branch that is already traced
+        forward, forward_tangents, closed = trace(x0, 1)
+        if closed:
+            curves.append((forward, forward_tangents))
+        else:
+            backward, backward_tangents, _ = trace(x0, -1)
+            curves.append((
+                np.concatenate((backward[::-1], forward[1:])),
+                np.concatenate((-backward_tangents[::-1], forward_tangents[1:])),
+                ))
 
-def plot_bifurcation_alpha(alpha_range, t, omega, g=1, b=0):
-    bifurcation_data = []
+    branches = list()
+    bifurcations = list()
+    for curve, tangents in curves:
+        branch = np.zeros(len(curve), dtype=branch_dtype)
+        branch["param"] = p_start + scale*curve[:, 0]
+        branch["theta"] = wrap(curve[:, 1])
+        branch["f_theta"] = f_theta(curve[:, 1], **{**fixed, param: branch["param"]})
+        branches.append(branch)
+
+        # Sign changes of f_theta between consecutive points, refined by bisection along the branch
+        # A saddle-node turns the branch back in param, a pitchfork does not
+        d = branch["f_theta"]
+        for i in np.nonzero(d[:-1]*d[1:] < 0)[0]:
+            x = locate(curve[i], curve[i + 1])
+            turn = tangents[i, 0]*tangents[i + 1, 0] < 0
+            bifurcations.append((p_start + scale*x[0], wrap(x[1]), "saddle-node" if turn else "pitchfork"))
+    return branches, np.array(bifurcations, dtype=bifurcation_dtype)
 
-    for alpha in alpha_range:
-        roots = find_all_roots_with_stability(omega, t, b, g, alpha )
-        for r, s in roots:
-            bifurcation_data.append((alpha, r, s))
-    bifurcation_data = np.array(bifurcation_data)
 
+def plot_branches(branches, bifurcations, xlabel, title, b=0):
     plt.figure(figsize=(10, 6))
-    for alpha, r, s in bifurcation_data:
-        color = 'blue' if s == 'stable' else 'red' if s == 'unstable' else 'green'
-        plt.scatter(alpha, r, color=color, s=10)
-    plt.xlabel(r'$\alpha$')
+    colors = {"stable": "blue", "unstable": "red", "center": "green"}
+    labelled = set()
+    for branch in branches:
+        labels = stability(branch["f_theta"], b)
+        # Split the branch where the stability changes, sharing the end points
+        changes = np.nonzero(labels[1:] != labels[:-1])[0] + 1
+        for start, stop in zip(np.r_[0, changes], np.r_[changes, len(branch)]):
+            label = labels[start]
+            segment = branch[max(start - 1, 0):stop]
+            # Break the line where the branch passes theta = +-pi
+            jumps = np.nonzero(np.abs(np.diff(segment["theta"])) > np.pi)[0] + 1
+            plt.plot(np.insert(segment["param"], jumps, np.nan), np.insert(segment["theta"], jumps, np.nan),
+                     color=colors[label],
+                     label=None if label in labelled else label)
+            labelled.add(label)
+    if len(bifurcations):
+        plt.scatter(bifurcations["param"], bifurcations["theta"], color="black", s=20, zorder=3,
+                    label="bifurcation")
+    plt.xlabel(xlabel)
     plt.ylabel(r'$\theta^*$')
-    plt.title('Bifurcation Diagram: Fixed Points vs Driving Amplitude')
+    plt.ylim(-np.pi, np.pi)
+    plt.title(title)
+    plt.legend()
     plt.grid()
     plt.show()
 
-def plot_bifurcation_time(t_range, omega, alpha, g=1, b=0):
-    bifurcation_data = []
+def plot_bifurcation_omega(omega_range, t, alpha, g =1, b=0):
+    branches, bifurcations = trace_branches("omega", (omega_range[0], omega_range[-1]), t=t, g=g, alpha=alpha,
+                                            n_seeds=len(omega_range))
+    plot_branches(branches, bifurcations, r'$\omega$',
+                  'Bifurcation Diagram: Fixed Points vs Driving Frequency', b)
 
-    for t in t_range:
-        roots = find_all_roots_with_stability(omega, t, b, g, alpha)
-        for r, s in roots:
-            bifurcation_data.append((t, r, s))
-    bifurcation_data = np.array(bifurcation_data)
+def plot_bifurcation_alpha(alpha_range, t, omega, g=1, b=0):
+    branches, bifurcations = trace_branches("alpha", (alpha_range[0], alpha_range[-1]), omega=omega, t=t, g=g,
+                                            n_seeds=len(alpha_range))
+    plot_branches(branches, bifurcations, r'$\alpha$',
+                  'Bifurcation Diagram: Fixed Points vs Driving Amplitude', b)
 
-    plt.figure(figsize=(10, 6))
-    for t, r, s in bifurcation_data:
-        color = 'blue' if s == 'stable' else 'red' if s == 'unstable' else 'green'
-        plt.scatter(t, r, color=color, s=10)
-    plt.xlabel(r'$t$')
-    plt.ylabel(r'$\theta^*$')
-    plt.title('Bifurcation Diagram: Fixed Points vs Time')
-    plt.grid()
-    plt.show()
+def plot_bifurcation_time(t_range, omega, alpha, g=1, b=0):
+    branches, bifurcations = trace_branches("t", (t_range[0], t_range[-1]), omega=omega, g=g, alpha=alpha,
+                                            n_seeds=len(t_range))
+    plot_branches(branches, bifurcations, r'$t$',
+                  'Bifurcation Diagram: Fixed Points vs Time', b)
 
 
 if __name__ == "__main__":
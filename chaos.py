@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Chaos indicators computed from stroboscopic series, batched over many
+trajectories at once. None of them needs the variational equations.
+
+zero_one_test: Gottwald–Melbourne 0-1 test for chaos (modified mean square
+displacement, correlation method). K is close to 0 for regular and close to 1
+for chaotic dynamics.
+
+recurrence_quantification: recurrence rate (fraction of pairs of stroboscopic
+points closer than eps) and determinism (fraction of the recurrences that form
+diagonal lines, i.e. stretches of the orbit that stay close for several drive
+periods) from a KD-tree. Periodic orbits have determinism 1, chaotic ones less.
+
+`chaos_indicators` runs both over the trajectories of a file and stores the
+result in the attributes of every trajectory group (`K_01`,
+`recurrence_rate`, `determinism`):
+
+    python chaos.py Data/dissip_trajectories.h5 --gamma 0.5
+"""
+import argparse
+import os
+import numpy as np
+import h5py
+import matplotlib
+import matplotlib.pyplot as plt
+from scipy.spatial import cKDTree
+from tqdm import tqdm
+from trajectory_store import TrajectoryStore, TrajectoryView
+
+plots_dir = "Plots/chaos/"
+
+
+def mean_square_displacement(p, n_cut):
+    """
+    mean_j (p[j+n] - p[j])**2 along the last axis for the lags n = 1..n_cut, for all lags at
+    once: the cross term is the autocorrelation (FFT), the squares come from cumulative sums.
+    """
+    N = p.shape[-1]
+    lags = np.arange(1, n_cut + 1)
+    squares = np.cumsum(p**2, axis=-1)
+    total = squares[..., -1:]
+    # sum_{j < N-n} p[j+n]**2 + p[j]**2
+    sum_squares = (total - squares[..., lags - 1]) + squares[..., N - lags - 1]
+    spectrum = np.fft.rfft(p, n=2*N, axis=-1)
+    cross = np.fft.irfft(spectrum*np.conj(spectrum), n=2*N, axis=-1)[..., lags]
+    return (sum_squares - 2*cross)/(N - lags)
+
+
+def zero_one_test(x, n_c=32, c_range=(np.pi/5, 4*np.pi/5), n_cut=None, seed=0, batch_bytes=256*2**20):
+    """
+    0-1 test for chaos of every row of x.
+    x: (n_series, N) array of equally long series (e.g. stroboscopic thetadot)
+    n_c: number of random values of c, all evaluated at once
+    n_cut: largest lag of the mean square displacement (default N//10)
+    Returns K, the median over c of the correlation coefficient, shape (n_series,).
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    n_series, N = x.shape
+    n_cut = n_cut or N//10
+    rng = np.random.default_rng(seed)
+    c = rng.uniform(*c_range, n_c)
+
+    j = np.arange(1, N + 1)
+    cos_cj = np.cos(np.outer(c, j))  # (n_c, N)
+    sin_cj = np.sin(np.outer(c, j))
+    lags = np.arange(1, n_cut + 1)
+
+    K = np.empty(n_series)
+    rows_per_batch = max(1, batch_bytes // (64 * n_c * N))
+    for start in range(0, n_series, rows_per_batch):
+        xb = x[start:start + rows_per_batch]
+        # Demeaned: the oscillating term of the modified test, (mean x)^2 (1 - cos(nc))/(1 - cos(c)),
+        # vanishes and D(n) is the mean square displacement itself
+        xb = xb - xb.mean(axis=1, keepdims=True)
+        p = np.cumsum(xb[:, None, :]*cos_cj[None], axis=2)  # (batch, n_c, N)
+        q = np.cumsum(xb[:, None, :]*sin_cj[None], axis=2)
+
+        D = mean_square_displacement(p, n_cut) + mean_square_displacement(q, n_cut)
+
+        # Correlation coefficient of D(n) with n, for every series and c
+        lag_dev = lags - lags.mean()
+        D_dev = D - D.mean(axis=2, keepdims=True)
+        corr = np.sum(D_dev*lag_dev, axis=2) / np.sqrt(np.sum(D_dev**2, axis=2)*np.sum(lag_dev**2) + 1e-300)
+        K[start:start + len(xb)] = np.median(corr, axis=1)
+    return K
+
+
+def recurrence_quantification(points, eps, l_min=2, theiler=1):
+    """
+    Recurrence rate and determinism of one orbit.
+    points: (N, d) array, e.g. stroboscopic points
+    eps: recurrence distance
+    l_min: shortest diagonal line counted as deterministic
+    theiler: pairs less than this many samples apart are not recurrences
+    """
+    N = len(points)
+    pairs = cKDTree(points).query_pairs(eps, output_type="ndarray")  # i < j
+    pairs = pairs[pairs[:, 1] - pairs[:, 0] >= theiler]
+    n_pairs = N*(N - 1)//2 - sum(N - d for d in range(1, theiler))
+    if len(pairs) == 0:
+        return 0.0, np.nan
+
+    # Runs of consecutive i along every diagonal j - i
+    offset = pairs[:, 1] - pairs[:, 0]
+    order = np.lexsort((pairs[:, 0], offset))
+    offset, i = offset[order], pairs[order, 0]
+    starts = np.r_[True, (np.diff(offset) != 0) | (np.diff(i) != 1)]
+    run_lengths = np.diff(np.r_[np.nonzero(starts)[0], len(i)])
+    return len(pairs)/n_pairs, run_lengths[run_lengths >= l_min].sum()/len(pairs)
+
+
+def chaos_indicators(path, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None,
+                     n_last=400, n_c=100, eps_fraction=0.1, l_min=2, write=True):
+    """
+    0-1 test (n_c values of c), recurrence rate and determinism of the last `n_last`
+    stroboscopic samples of the selected trajectories (see TrajectoryStore.find).
+    Points are embedded as (cos(theta), sin(theta), thetadot/std(thetadot)) and eps is
+    eps_fraction times their RMS distance from the centroid.
+    With write=True the results are stored in the attributes of the trajectory groups.
+    Returns a structured array (catalog columns, K_01, recurrence_rate, determinism).
+    """
+    with TrajectoryStore(path, cache_bytes=0) as store:
+        rows = store.find(alpha, omega, theta0, thetadot0, gamma)
+        theta = np.full((len(rows), n_last), np.nan)
+        thetadot = np.full((len(rows), n_last), np.nan)
+        for i, path_i in enumerate(tqdm(rows["path"], desc="Reading")):
+            theta_strob, thetadot_strob = TrajectoryView(store, path_i).poincare(wrap=False)
+            if len(theta_strob) >= n_last:
+                theta[i] = theta_strob[-n_last:]
+                thetadot[i] = thetadot_strob[-n_last:]
+
+    table = np.zeros(len(rows), dtype=rows.dtype.descr + [
+        ("K_01", float),
+        ("recurrence_rate", float),
+        ("determinism", float),
+        ])
+    for name in rows.dtype.names:
+        table[name] = rows[name]
+    table["K_01"] = np.nan
+    table["recurrence_rate"] = np.nan
+    table["determinism"] = np.nan
+
+    complete = ~np.isnan(theta).any(axis=1)
+    table["K_01"][complete] = zero_one_test(thetadot[complete], n_c=n_c)
+    for i in tqdm(np.nonzero(complete)[0], desc="Recurrences"):
+        points = np.column_stack((np.cos(theta[i]), np.sin(theta[i]), thetadot[i]/(thetadot[i].std() + 1e-12)))
+        eps = eps_fraction*np.sqrt(np.mean(np.sum((points - points.mean(axis=0))**2, axis=1)))
+        table["recurrence_rate"][i], table["determinism"][i] = recurrence_quantification(points, max(eps, 1e-9), l_min)
+
+    if write:
+        with h5py.File(path, "a") as file:
+            for row in table[complete]:
+                attrs = file[row["path"]].attrs
+                for name in ("K_01", "recurrence_rate", "determinism"):
+                    attrs[name] = row[name]
+                attrs["chaos_n_last"] = n_last
+    return table
+
+
+def plot_chaos_map(table, name="K_01", title="", file_name=None):
+    """alpha-omega image of one indicator column of a chaos_indicators table (one gamma and initial condition)."""
+    alphas = np.unique(table["alpha"])
+    omegas = np.unique(table["omega"])
+    image = np.full((len(alphas), len(omegas)), np.nan)
+    image[np.searchsorted(alphas, table["alpha"]), np.searchsorted(omegas, table["omega"])] = table[name]
+
+    plt.figure(figsize=(10, 7))
+    plt.pcolormesh(omegas, alphas, np.ma.masked_invalid(image), cmap="magma", shading="nearest")
+    plt.colorbar(label=name.replace("_", " "))
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel(r"$\alpha\,(deg)$")
+    plt.title(name.replace("_", " ") + ("\n" + title if title else ""))
+    if file_name:
+        plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="0-1 test and recurrence statistics of a trajectory file.")
+    parser.add_argument("file")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=0.0)
+    parser.add_argument("--n-last", type=int, default=400, help="Number of stroboscopic samples used")
+    parser.add_argument("--n-c", type=int, default=100, help="Number of random c values of the 0-1 test")
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    table = chaos_indicators(args.file, theta0=args.theta0, thetadot0=args.thetadot0, gamma=args.gamma,
+                             n_last=args.n_last, n_c=args.n_c)
+    print(f"Chaos indicators of {np.sum(~np.isnan(table['K_01']))} trajectories written to the attributes of {args.file}")
+
+    os.makedirs(plots_dir, exist_ok=True)
+    for name in ("K_01", "determinism"):
+        plot_chaos_map(
+                table, name,
+                title=rf"$\gamma={args.gamma}\quad \theta_0={args.theta0}^\circ,\, \dot\theta_0={args.thetadot0}$",
+                file_name=f"{plots_dir}{name}_{args.gamma}_{args.theta0:04.1f}_{args.thetadot0:04.1f}.jpg",
+                )
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Automatic classification of the attractors of every trajectory of a file,
+from the stroboscopic samples of the last `n_last` drive periods.
+
+    ROTATING       regular motion over which theta drifts by at least `min_windings` revolutions
+    PERIODIC       the stroboscopic map is period-k (k <= max_period)
+    QUASIPERIODIC  0-1 test K below `k_threshold` and the points lie on a closed curve
+    CHAOTIC        0-1 test K above `k_threshold`
+    UNKNOWN        none of the above (e.g. regular but not on a simple closed curve)
+
+The last `n_last` stroboscopic samples of all trajectories are stacked and
+classified together as 2D arrays. The result is written to the `regimes` table of the
+file and rendered as an alpha-omega regime map.
+
+Usage:
+    python classify.py Data/dissip_trajectories.h5 --gamma 0.5
+"""
+import argparse
+import os
+import numpy as np
+import h5py
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
+from matplotlib.patches import Patch
+import storage_setup
+from chaos import zero_one_test
+from trajectory_store import TrajectoryStore, TrajectoryView, wrap_theta
+
+plots_dir = "Plots/regimes/"
+
+UNKNOWN, PERIODIC, QUASIPERIODIC, CHAOTIC, ROTATING = range(5)
+REGIME_NAMES = {
+    UNKNOWN: "unknown",
+    PERIODIC: "periodic",
+    QUASIPERIODIC: "quasi-periodic",
+    CHAOTIC: "chaotic",
+    ROTATING: "rotating",
+    }
+
+regimes_dtype = np.dtype([
+    ("path", object),
+    ("alpha", float),  # degrees
+    ("omega", float),
+    ("theta0", float),  # degrees
+    ("thetadot0", float),
+    ("gamma", float),
+    ("label", np.int64),
+    ("period", np.int64),
+    ("K", float),  # 0-1 test
+    ("roughness", float),  # closed curve test, small for points on a smooth closed curve
+    ("windings", float),
+    ])
+
+
+def strob_periods(theta, thetadot, max_period=16, tol=1e-3):
+    """
+    Smallest k <= max_period for which every row is k-periodic within tol, 0 if none.
+    theta, thetadot: (n_series, N) stroboscopic samples
+    """
+    period = np.zeros(theta.shape[0], dtype=np.int64)
+    for k in range(max_period, 0, -1):  # Descending, so the smallest k is assigned last
+        distance = np.max(np.abs(wrap_theta(theta[:, k:] - theta[:, :-k])) + np.abs(thetadot[:, k:] - thetadot[:, :-k]), axis=1)
+        period[distance < tol] = k
+    return period
+
+
+def curve_roughness(theta, thetadot):
+    """
+    Closed curve test. The points of every row are sorted by polar angle about
+    their centre; on a smooth closed curve the radius then changes little from
+    point to point, in a cloud it jumps. Returns mean|dr|/mean(r) per row.
+    """
+    centre = np.angle(np.mean(np.exp(1j*theta), axis=1, keepdims=True))
+    x = wrap_theta(theta - centre)
+    y = thetadot - thetadot.mean(axis=1, keepdims=True)
+    x = x / (x.std(axis=1, keepdims=True) + 1e-12)
+    y = y / (y.std(axis=1, keepdims=True) + 1e-12)
+
+    order = np.argsort(np.arctan2(y, x), axis=1)
+    r = np.take_along_axis(np.hypot(x, y), order, axis=1)
+    dr = np.abs(np.diff(np.concatenate((r, r[:, :1]), axis=1), axis=1))
+    return dr.mean(axis=1) / (r.mean(axis=1) + 1e-12)
+
+
+def classify(theta, thetadot, max_period=16, tol=1e-3, k_threshold=0.5, roughness_threshold=0.2, min_windings=1):
+    """
+    Classifies every row of the stroboscopic samples theta (unwrapped) and thetadot, shape (n_series, N).
+    Returns a dictionary of the label, period, K, roughness and windings columns.
+    """
+    windings = (theta[:, -1] - theta[:, 0])/(2*np.pi)
+    period = strob_periods(theta, thetadot, max_period, tol)
+
+    label = np.full(theta.shape[0], UNKNOWN)
+    label[period > 0] = PERIODIC
+
+    K = np.full(theta.shape[0], np.nan)
+    roughness = np.full(theta.shape[0], np.nan)
+    rest = period == 0
+    if np.any(rest):
+        K[rest] = zero_one_test(thetadot[rest])
+        roughness[rest] = curve_roughness(theta[rest], thetadot[rest])
+        label[rest & (K >= k_threshold)] = CHAOTIC
+        label[rest & (K < k_threshold) & (roughness < roughness_threshold)] = QUASIPERIODIC
+
+    # Regular motion with a net drift of theta; chaotic motion may also drift, diffusively
+    rotating = (np.abs(windings) >= min_windings) & (label != CHAOTIC)
+    label[rotating] = ROTATING
+
+    return {"label": label, "period": period, "K": K, "roughness": roughness, "windings": windings}
+
+
+def classify_store(path, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None, n_last=200, **kwargs):
+    """
+    Classifies the selected trajectories (see TrajectoryStore.find) of the file at
+    path and merges the result into its `regimes` table. kwargs are passed on to
+    classify. Returns the new rows.
+    """
+    with TrajectoryStore(path, cache_bytes=0) as store:
+        rows = store.find(alpha, omega, theta0, thetadot0, gamma)
+        table = np.zeros(len(rows), dtype=regimes_dtype)
+        for name in ("path", "alpha", "omega", "theta0", "thetadot0", "gamma"):
+            table[name] = rows[name]
+        table["label"] = UNKNOWN
+        table["K"] = np.nan
+        table["roughness"] = np.nan
+
+        theta = np.full((len(rows), n_last), np.nan)
+        thetadot = np.full((len(rows), n_last), np.nan)
+        complete = np.zeros(len(rows), dtype=bool)
+        for i, path_i in enumerate(rows["path"]):
+            theta_strob, thetadot_strob = TrajectoryView(store, path_i).poincare(wrap=False)
+            if len(theta_strob) >= n_last:
+                theta[i] = theta_strob[-n_last:]
+                thetadot[i] = thetadot_strob[-n_last:]
+                complete[i] = True
+
+    if np.any(complete):
+        for name, values in classify(theta[complete], thetadot[complete], **kwargs).items():
+            table[name][complete] = values
+
+    with h5py.File(path, "a") as file:
+        old = storage_setup.read_table(file, "regimes")
+        if old is not None:
+            old = old[~np.isin(old["path"], table["path"])].astype(regimes_dtype)
+            merged = np.concatenate((old, table))
+        else:
+            merged = table
+        merged = merged[np.lexsort((merged["omega"], merged["alpha"]))]
+        storage_setup.write_table(file, "regimes", merged, attrs={f"label_{k}": v for k,v in REGIME_NAMES.items()})
+    return table
+
+
+def load_regimes(path):
+    """The `regimes` table of the file at path (None if it was never computed)."""
+    with h5py.File(path, "r") as file:
+        return storage_setup.read_table(file, "regimes")
+
+
+# Colours of the regime map: unknown, period 1, period 2, period >= 3, quasi-periodic, chaotic, rotating
+map_colors = ["white", "tab:blue", "tab:cyan", "tab:green", "tab:orange", "black", "tab:red"]
+map_names = ["unknown", "period 1", "period 2", r"period $\geq 3$", "quasi-periodic", "chaotic", "rotating"]
+
+def map_code(label, period):
+    code = np.zeros(label.shape, dtype=int)
+    code[label == PERIODIC] = np.clip(period[label == PERIODIC], 1, 3)
+    code[label == QUASIPERIODIC] = 4
+    code[label == CHAOTIC] = 5
+    code[label == ROTATING] = 6
+    return code
+
+
+def plot_regime_map(table, title="", file_name=None):
+    """Renders the rows of a regimes table (one gamma and initial condition) as an alpha-omega image."""
+    alphas = np.unique(table["alpha"])
+    omegas = np.unique(table["omega"])
+    image = np.full((len(alphas), len(omegas)), np.nan)
+    image[np.searchsorted(alphas, table["alpha"]), np.searchsorted(omegas, table["omega"])] = map_code(table["label"], table["period"])
+
+    plt.figure(figsize=(10, 7))
+    plt.pcolormesh(omegas, alphas, np.ma.masked_invalid(image), cmap=ListedColormap(map_colors),
+                   vmin=-0.5, vmax=len(map_colors) - 0.5, shading="nearest")
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel(r"$\alpha\,(deg)$")
+    plt.title("Regime map" + ("\n" + title if title else ""))
+    plt.legend(handles=[Patch(facecolor=c, edgecolor="grey", label=n) for c, n in zip(map_colors, map_names)],
+               loc="upper left", bbox_to_anchor=(1.01, 1))
+    if file_name:
+        plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify the attractors of a trajectory file and draw the regime map.")
+    parser.add_argument("file")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=0.0)
+    parser.add_argument("--n-last", type=int, default=200, help="Number of stroboscopic samples used")
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    table = classify_store(args.file, theta0=args.theta0, thetadot0=args.thetadot0, gamma=args.gamma, n_last=args.n_last)
+    for code, name in REGIME_NAMES.items():
+        print(f"{name:>15}: {np.sum(table['label'] == code)}")
+
+    os.makedirs(plots_dir, exist_ok=True)
+    plot_regime_map(
+            table,
+            title=rf"$\gamma={args.gamma}\quad \theta_0={args.theta0}^\circ,\, \dot\theta_0={args.thetadot0}$",
+            file_name=f"{plots_dir}regimes_{args.gamma}_{args.theta0:04.1f}_{args.thetadot0:04.1f}.jpg",
+            )
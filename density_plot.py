@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Rasterized density rendering of large point clouds (e.g. stroboscopic
+bifurcation diagrams). Points are binned into a fixed 2D histogram as they
+arrive, chunk by chunk, so the full cloud never has to be kept in memory, and
+the histogram is drawn with a single `imshow` instead of a scatter of every
+point.
+
+    >>> density = DensityHistogram(x_range=(1, 6), y_range=(-np.pi, np.pi), bins=(250, 720))
+    >>> for omega, theta in chunks:
+    ...     density.add(omega, theta)
+    >>> density.plot()
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm, Normalize, ListedColormap
+
+
+class DensityHistogram:
+    """
+    Accumulates points into a 2D histogram.
+    x_range, y_range: (min, max) of the image; points outside are dropped
+    bins: number of (x, y) bins
+    """
+    def __init__(self, x_range, y_range, bins=(1000, 720)):
+        self.x_range = x_range
+        self.y_range = y_range
+        self.bins = bins
+        self.counts = np.zeros(bins[0]*bins[1], dtype=np.int64)
+
+    def add(self, x, y):
+        """Adds a chunk of points. A scalar x (or y) applies to every point of the chunk."""
+        y = np.asarray(y, dtype=float).ravel()
+        x = np.broadcast_to(np.asarray(x, dtype=float), y.shape).ravel()
+
+        nx, ny = self.bins
+        ix = np.floor((x - self.x_range[0]) / (self.x_range[1] - self.x_range[0]) * nx).astype(np.int64)
+        iy = np.floor((y - self.y_range[0]) / (self.y_range[1] - self.y_range[0]) * ny).astype(np.int64)
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        self.counts += np.bincount(ix[inside]*ny + iy[inside], minlength=nx*ny)
+
+    @property
+    def image(self):
+        """Counts as an (ny, nx) array, y increasing with the row index."""
+        return self.counts.reshape(self.bins).T
+
+    def plot(self, ax=None, log=True, cmap="Greys", min_shade=0.35, **kwargs):
+        """
+        Draws the histogram with imshow. With log=True the shading is logarithmic in the counts.
+        min_shade: fraction of the colormap skipped at the low end, so that bins with a
+                   single point stay visible
+        Returns the image artist.
+        """
+        ax = ax or plt.gca()
+        cmap = ListedColormap(plt.get_cmap(cmap)(np.linspace(min_shade, 1, 256)))
+        cmap.set_bad(alpha=0)
+        image = np.ma.masked_equal(self.image, 0)  # Empty bins are transparent
+        if log:
+            norm = LogNorm(vmin=1, vmax=max(image.max(), 1))
+        else:
+            norm = Normalize(vmin=0, vmax=max(image.max(), 1))
+        return ax.imshow(
+                image, origin="lower", aspect="auto", interpolation="nearest",
+                extent=(*self.x_range, *self.y_range), norm=norm, cmap=cmap, **kwargs,
+                )
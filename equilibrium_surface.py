@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+Instantaneous (quasi-static) equilibria of the driven hoop.
+
+In tau = omega*t the equation of motion is
+
+    theta'' = -B theta' - (A cos(alpha) - cos(theta)) sin(theta) + A sin(alpha) sin(tau) cos(theta),
+    A = g/(R omega^2),  B = gamma/omega
+
+With the drive frozen at the phase phi = tau mod 2 pi, the equilibria solve
+
+    (A cos(alpha) - cos(theta)) sin(theta) - A sin(alpha) sin(phi) cos(theta) = 0
+
+which is `f` of bifuraction_diagrams.py with g -> g/R and omega*t -> phi - pi/2.
+With z = exp(i theta) this is the quartic
+
+    z^4 - 2(a - ib) z^3 + 2(a + ib) z - 1 = 0,  a = A cos(alpha),  b = A sin(alpha) sin(phi)
+
+whose roots on the unit circle are the equilibria. The roots of a whole
+(phi, omega, alpha) grid are the eigenvalues of a stack of 4x4 companion
+matrices, computed in one vectorized pass and polished with Newton steps.
+
+The surface theta*(phi, omega, alpha) is cached to disk, and queries interpolate
+in phi on the nearest (omega, alpha) node of the grid (queries outside the grid
+raise ValueError):
+
+    >>> surface = load_or_compute()
+    >>> roots, stable = surface.query(tau % (2*np.pi), omega=5.8, alpha=np.deg2rad(60))
+"""
+import os
+import numpy as np
+from trajectory_store import wrap_theta
+
+g = 9.8
+R = 0.355/2
+cache_path = "Data/equilibrium_surface.npz"
+max_roots = 4
+
+
+def residual(theta, A, alpha, phase):
+    """Equilibrium condition in units of omega^2 and its derivative in theta."""
+    a = A*np.cos(alpha)
+    b = A*np.sin(alpha)*np.sin(phase)
+    value = (a - np.cos(theta))*np.sin(theta) - b*np.cos(theta)
+    derivative = a*np.cos(theta) - np.cos(2*theta) + b*np.sin(theta)
+    return value, derivative
+
+
+def instantaneous_equilibria(phase, omega, alpha, g=g, R=R, batch_size=2**20):
+    """
+    All equilibria for every combination of the broadcast arrays phase, omega and alpha (radians).
+    Returns (roots, f_theta), both of shape (*broadcast shape, 4): the roots in [-pi, pi)
+    in ascending order, padded with NaN, and the derivative of the equilibrium condition
+    at each root (positive for a stable equilibrium).
+    """
+    phase, omega, alpha = np.broadcast_arrays(phase, omega, alpha)
+    shape = phase.shape
+    phase, omega, alpha = (np.ravel(x).astype(float) for x in (phase, omega, alpha))
+    A = g/(R*omega**2)
+
+    roots = np.full((phase.size, max_roots), np.nan)
+    for start in range(0, phase.size, batch_size):
+        s = slice(start, start + batch_size)
+        a = A[s]*np.cos(alpha[s])
+        b = A[s]*np.sin(alpha[s])*np.sin(phase[s])
+
+        companion = np.zeros((len(a), 4, 4), dtype=complex)
+        companion[:, 0, 0] = 2*(a - 1j*b)
+        companion[:, 0, 2] = -2*(a + 1j*b)
+        companion[:, 0, 3] = 1
+        companion[:, 1, 0] = companion[:, 2, 1] = companion[:, 3, 2] = 1
+        z = np.linalg.eigvals(companion)
+
+        # Roots on the unit circle (loose tolerance for the nearly double roots of a saddle-node)
+        theta = np.where(np.abs(np.abs(z) - 1) < 1e-4, np.angle(z), np.nan)
+        for _ in range(2):
+            value, derivative = residual(theta, A[s, None], alpha[s, None], phase[s, None])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = value/derivative
+            theta = theta - np.where(np.abs(step) < 1e-3, step, 0)
+        roots[s] = np.sort(wrap_theta(theta), axis=1)
+
+    _, f_theta = residual(roots, A[:, None], alpha[:, None], phase[:, None])
+    return roots.reshape(*shape, max_roots), f_theta.reshape(*shape, max_roots)
+
+
+def _nearest_node(grid, value, name):
+    """Index of the grid node nearest to value, which may lie at most half a grid step outside the grid."""
+    half_step = 0.5*np.min(np.diff(np.sort(grid))) if len(grid) > 1 else 0.0
+    tolerance = half_step + 1e-9*max(1.0, abs(value))
+    if not grid.min() - tolerance <= value <= grid.max() + tolerance:
+        raise ValueError(f"{name}={value} is outside the grid [{grid.min()}, {grid.max()}] of the surface")
+    return np.argmin(np.abs(grid - value))
+
+
+class EquilibriumSurface:
+    """
+    theta*(phi, omega, alpha) on a grid.
+    roots, stable: arrays of shape (n_phases, n_omegas, n_alphas, 4), roots NaN padded
+    """
+    def __init__(self, phases, omegas, alphas, roots, stable, g=g, R=R):
+        self.phases = phases
+        self.omegas = omegas
+        self.alphas = alphas
+        self.roots = roots
+        self.stable = stable
+        self.g = g
+        self.R = R
+
+    @classmethod
+    def compute(cls, omegas, alphas, n_phases=128, g=g, R=R):
+        """alphas in radians"""
+        phases = 2*np.pi*np.arange(n_phases)/n_phases
+        roots, f_theta = instantaneous_equilibria(
+                phases[:, None, None], np.asarray(omegas)[None, :, None], np.asarray(alphas)[None, None, :], g, R)
+        return cls(phases, np.asarray(omegas, dtype=float), np.asarray(alphas, dtype=float),
+                   roots.astype(np.float32), f_theta > 0, g, R)
+
+    def save(self, path):
+        np.savez(path, phases=self.phases, omegas=self.omegas, alphas=self.alphas,
+                 roots=self.roots, stable=self.stable, g=self.g, R=self.R)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["phases"], data["omegas"], data["alphas"], data["roots"], data["stable"],
+                       float(data["g"]), float(data["R"]))
+
+    def covers(self, omegas, alphas, n_phases, g, R):
+        return (
+            len(self.phases) == n_phases and self.g == g and self.R == R
+            and np.array_equal(self.omegas, np.asarray(omegas, dtype=float))
+            and np.array_equal(self.alphas, np.asarray(alphas, dtype=float))
+            )
+
+    def query(self, phase, omega, alpha):
+        """
+        Equilibria at the drive phases `phase` (array) for one (omega, alpha), alpha in radians.
+        omega and alpha are snapped to the nearest grid node (ValueError more than half a grid
+        step outside the grid), the phase is interpolated linearly, following every root to the
+        nearest root of the next phase sample.
+        Roots born or annihilated between two phase samples are NaN over that interval (of roots
+        meeting the same root of the next sample, only the nearest one continues), and not stable.
+        Returns (roots, stable) of shape (*phase.shape, 4).
+        """
+        i_omega = _nearest_node(self.omegas, omega, "omega")
+        i_alpha = _nearest_node(self.alphas, alpha, "alpha")
+        roots = self.roots[:, i_omega, i_alpha].astype(float)
+        stable = self.stable[:, i_omega, i_alpha]
+
+        n_phases = len(self.phases)
+        position = (np.asarray(phase, dtype=float) % (2*np.pi))/(2*np.pi)*n_phases
+        lo = np.floor(position).astype(int) % n_phases
+        hi = (lo + 1) % n_phases
+        w = (position - np.floor(position))[..., None]
+
+        lo_roots, hi_roots = roots[lo], roots[hi]
+        distance = np.abs(wrap_theta(hi_roots[..., None, :] - lo_roots[..., :, None]))
+        distance = np.where(np.isnan(distance), np.inf, distance)
+        nearest = np.argmin(distance, axis=-1)
+        target = np.take_along_axis(hi_roots, nearest, axis=-1)
+        # Of the roots that meet the same root, the nearest one continues into it, the others
+        # are annihilated in a saddle-node within the interval
+        gap = np.min(distance, axis=-1)
+        valid = ~np.isnan(lo_roots)
+        same = (nearest[..., :, None] == nearest[..., None, :]) & valid[..., :, None] & valid[..., None, :]
+        index = np.arange(roots.shape[-1])
+        closer = (gap[..., None, :] < gap[..., :, None]) | (
+            (gap[..., None, :] == gap[..., :, None]) & (index[None, :] < index[:, None]))
+        target[np.any(same & closer, axis=-1)] = np.nan
+
+        # Exactly on a phase sample every root of the sample is known
+        result = np.where(w == 0, lo_roots, wrap_theta(lo_roots + w*wrap_theta(target - lo_roots)))
+        return result, stable[lo] & ~np.isnan(result)
+
+
+def load_or_compute(path=cache_path, omegas=np.arange(1, 6.001, 0.02).round(3),
+                    alphas=np.deg2rad(np.arange(0, 90)), n_phases=128, g=g, R=R):
+    """The cached surface at path, (re)computed and saved if missing or for another grid."""
+    if os.path.isfile(path):
+        surface = EquilibriumSurface.load(path)
+        if surface.covers(omegas, alphas, n_phases, g, R):
+            return surface
+    surface = EquilibriumSurface.compute(omegas, alphas, n_phases, g, R)
+    surface.save(path)
+    return surface
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    t0 = perf_counter()
+    surface = load_or_compute()
+    print(f"Equilibrium surface {surface.roots.shape[:3]} ready in {perf_counter() - t0:.2f} sec ({cache_path})")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Simulates a whole experimental run with the measured, drifting hoop angular
+velocity and overlays it on the tracked bead angle.
+
+The tracker's CSV export (Time_s, Raw_Theta_deg, ...) only holds the bead. The
+drive comes from either
+- the tripwire lap marks saved by the tracker (lap_marks_<video>.txt, video time in sec), or
+- a two column text file of measured (t, omega) samples, or
+- a constant --omega.
+Bead times start at the frame selected for bead tracking, --t-offset is the
+video time of that frame, so that both share the time axis of the lap marks.
+
+    python experiment_overlay.py "Tracker - Python Implementation/Data/long_time_limit_nonconst_omegacsv" \
+        --laps lap_marks_run.txt --alpha 60 --gamma 0.5
+"""
+import argparse
+import os
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from time_evolution import drive_profile, drive_profile_from_laps, time_evolve_variable_omega
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/experiment_overlay/"
+
+
+def load_tracker_csv(path):
+    """(t, theta) of the tracker's CSV export, theta in radians."""
+    data = np.genfromtxt(path, delimiter=",", names=True)
+    return data["Time_s"], np.deg2rad(data["Raw_Theta_deg"])
+
+
+def initial_conditions(t, theta, n_fit=9):
+    """theta and thetadot at t[0] from a quadratic fit to the first n_fit tracked samples."""
+    coefficients = np.polyfit(t[:n_fit] - t[0], theta[:n_fit], 2)
+    return coefficients[2], coefficients[1]
+
+
+def simulate_run(t, theta, profile, alpha, gamma=0.5, t_offset=0.0, phase0=0.0, g=g, R=R, n_fit=9):
+    """
+    The simulated theta on the tracked time grid t (sec, bead time), started from the first
+    tracked samples. profile is in video time, t_offset is the video time of bead time 0.
+    """
+    theta0, thetadot0 = initial_conditions(t, theta, n_fit)
+    _, (theta_sim, _) = time_evolve_variable_omega(
+            theta0, thetadot0, t + t_offset, profile, alpha, gamma, g, R, phase0=phase0)
+    return theta_sim
+
+
+def plot_overlay(t, theta, theta_sim, omega, title="", file_name=None):
+    fig, (ax_theta, ax_omega) = plt.subplots(2, 1, figsize=(12, 8), sharex=True, height_ratios=(3, 1))
+    ax_theta.plot(t, theta, ".", color="black", markersize=1, label="Tracked")
+    ax_theta.plot(t[:len(theta_sim)], theta_sim, "-", color="red", lw=0.8, label="Simulated")
+    ax_theta.set_ylabel(r"$\theta\;(rad)$")
+    ax_theta.legend()
+    ax_theta.grid(True, linestyle="--", alpha=0.7)
+    ax_omega.plot(t, omega, color="blue")
+    ax_omega.set_xlabel(r"$t\;(s)$")
+    ax_omega.set_ylabel(r"$\omega\;(rad/s)$")
+    ax_omega.grid(True, linestyle="--", alpha=0.7)
+    ax_theta.set_title(title)
+    if file_name:
+        fig.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overlay a simulation with the measured omega(t) on tracked data.")
+    parser.add_argument("csv", help="Tracker CSV export (Time_s, Raw_Theta_deg, ...)")
+    drive = parser.add_mutually_exclusive_group(required=True)
+    drive.add_argument("--laps", help="Text file of tripwire lap mark times (sec)")
+    drive.add_argument("--omega-samples", help="Text file of (t, omega) rows")
+    drive.add_argument("--omega", type=float, help="Constant omega (rad/s)")
+    parser.add_argument("--smoothing", type=float, default=None, help="Spline smoothing of the drive profile")
+    parser.add_argument("--alpha", type=float, required=True, help="degrees")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--t-offset", type=float, default=0.0, help="Video time (sec) of the first bead frame")
+    parser.add_argument("--phase0", type=float, default=0.0, help="Drive phase (degrees) at the first lap mark")
+    args = parser.parse_args()
+
+    if args.laps:
+        profile = drive_profile_from_laps(np.loadtxt(args.laps, ndmin=1), args.smoothing)
+    elif args.omega_samples:
+        samples = np.loadtxt(args.omega_samples, ndmin=2)
+        profile = drive_profile(samples[:, 0], samples[:, 1], args.smoothing)
+    else:
+        profile = drive_profile([0.0], [args.omega])
+
+    matplotlib.use("Agg")
+    t, theta = load_tracker_csv(args.csv)
+    theta_sim = simulate_run(t, theta, profile, np.deg2rad(args.alpha), args.gamma,
+                             t_offset=args.t_offset, phase0=np.deg2rad(args.phase0))
+    omega = profile(t + args.t_offset)[:, 0]
+
+    os.makedirs(plots_dir, exist_ok=True)
+    plot_overlay(
+            t, theta, theta_sim, omega,
+            title=rf"$\alpha={args.alpha:05.2f}^\circ\quad \gamma={args.gamma}$",
+            file_name=f"{plots_dir}{os.path.splitext(os.path.basename(args.csv))[0]}_{args.alpha:05.2f}_{args.gamma}.jpg",
+            )
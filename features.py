@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Streaming feature extraction over a trajectory file.
+
+Every trajectory is read block by block (whole drive periods at a time, never
+the full arrays) and summarised by
+
+    amplitude      theta_max - theta_min of theta wrapped to [-pi, pi)
+    mean, rms      of wrapped theta
+    winding        net number of revolutions (theta is stored unwrapped)
+    peak_freqs     frequencies (in units of omega) of the strongest peaks of the
+    peak_amps      Welch averaged spectrum of wrapped theta, and their amplitudes
+    n_poincare     number of distinct stroboscopic points (rounded to `decimals`)
+    period         smallest k such that the stroboscopic map is k-periodic, 0 if none
+
+The results are written to the `features` table of the same file (see
+storage_setup.write_table), so amplitude curves and regime maps are table
+lookups:
+
+    >>> with h5py.File("Data/dissip_trajectories.h5", "r") as file:
+    ...     features = storage_setup.read_table(file, "features")
+    >>> rows = features[select(features["alpha"], 22) & select(features["gamma"], 0.5)]
+    >>> plt.plot(rows["omega"], rows["amplitude"])
+
+Usage:
+    python features.py Data/dissip_trajectories.h5
+"""
+import argparse
+import numpy as np
+import h5py
+from tqdm import tqdm
+import storage_setup
+from trajectory_store import TrajectoryStore, TrajectoryView, build_catalog, wrap_theta
+
+n_peaks = 3
+
+features_dtype = np.dtype([
+    ("path", object),
+    ("alpha", float),  # degrees
+    ("omega", float),
+    ("theta0", float),  # degrees
+    ("thetadot0", float),
+    ("gamma", float),
+    ("amplitude", float),
+    ("mean", float),
+    ("rms", float),
+    ("winding", np.int64),
+    ("peak_freqs", float, (n_peaks,)),
+    ("peak_amps", float, (n_peaks,)),
+    ("n_poincare", np.int64),
+    ("period", np.int64),
+    ])
+
+
+def strob_period(theta_strob, thetadot_strob, max_period=16, tol=1e-3, tail=0.5):
+    """
+    Smallest k <= max_period for which the last `tail` fraction of the
+    stroboscopic series satisfies x[n+k] == x[n] within tol. 0 if there is none.
+    """
+    start = int(len(theta_strob)*(1 - tail))
+    theta = theta_strob[start:]
+    thetadot = thetadot_strob[start:]
+    for k in range(1, min(max_period, len(theta) - 1) + 1):
+        d_theta = np.abs(wrap_theta(theta[k:] - theta[:-k]))
+        d_thetadot = np.abs(thetadot[k:] - thetadot[:-k])
+        if np.max(d_theta + d_thetadot) < tol:
+            return k
+    return 0
+
+
+def spectral_peaks(psd, freqs, n=n_peaks):
+    """Frequencies and amplitudes of the n largest local maxima of psd (DC excluded)."""
+    interior = (psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])
+    idx = np.flatnonzero(interior) + 1
+    idx = idx[np.argsort(psd[idx])[::-1][:n]]
+    peak_freqs = np.full(n, np.nan)
+    peak_amps = np.full(n, np.nan)
+    peak_freqs[:len(idx)] = freqs[idx]
+    peak_amps[:len(idx)] = np.sqrt(psd[idx])
+    return peak_freqs, peak_amps
+
+
+def extract_features(group, block_periods=64, fft_periods=16, decimals=3, max_period=16):
+    """
+    Features of one trajectory group, reading `block_periods` drive periods at a time.
+    fft_periods: length of the Welch segments, in drive periods
+    decimals: rounding used to count distinct Poincaré points
+    Returns a dictionary of the feature columns.
+    """
+    samples = int(group.attrs.get("samples_per_period", 64))
+    theta_ds = group["theta"]
+    thetadot_ds = group["thetadot"]
+    n_samples = theta_ds.shape[0]
+
+    block = block_periods * samples
+    segment = fft_periods * samples
+    window = np.hanning(segment)
+    freqs = np.fft.rfftfreq(segment, d=1/samples)  # In units of the drive frequency omega
+
+    theta_min, theta_max = np.inf, -np.inf
+    total, total_sq = 0.0, 0.0
+    psd = np.zeros(freqs.size)
+    n_segments = 0
+    theta_strob = list()
+    thetadot_strob = list()
+    first = last = None
+
+    for start in range(0, n_samples, block):
+        theta = theta_ds[start:start + block]
+        if first is None:
+            first = theta[0]
+        last = theta[-1]
+        theta_strob.append(theta[::samples])
+        thetadot_strob.append(thetadot_ds[start:start + block:samples])
+
+        wrapped = wrap_theta(theta)
+        theta_min = min(theta_min, wrapped.min())
+        theta_max = max(theta_max, wrapped.max())
+        total += wrapped.sum()
+        total_sq += np.dot(wrapped, wrapped)
+
+        # Welch: full segments of this block, mean removed per segment
+        n_full = wrapped.size // segment
+        if n_full:
+            segments = wrapped[:n_full*segment].reshape(n_full, segment)
+            segments = (segments - segments.mean(axis=1, keepdims=True)) * window
+            psd += np.sum(np.abs(np.fft.rfft(segments, axis=1))**2, axis=0)
+            n_segments += n_full
+
+    mean = total/n_samples
+    if n_segments:
+        psd *= (2/np.sum(window))**2 / n_segments  # Amplitude spectrum squared
+        peak_freqs, peak_amps = spectral_peaks(psd, freqs)
+    else:
+        peak_freqs, peak_amps = np.full(n_peaks, np.nan), np.full(n_peaks, np.nan)
+
+    theta_strob = np.concatenate(theta_strob)
+    thetadot_strob = np.concatenate(thetadot_strob)
+    points = np.round(np.column_stack((wrap_theta(theta_strob), thetadot_strob)), decimals)
+
+    return {
+        "amplitude": theta_max - theta_min,
+        "mean": mean,
+        "rms": np.sqrt(total_sq/n_samples),
+        "winding": int(np.floor((last + np.pi)/(2*np.pi)) - np.floor((first + np.pi)/(2*np.pi))),
+        "peak_freqs": peak_freqs,
+        "peak_amps": peak_amps,
+        "n_poincare": len(np.unique(points, axis=0)),
+        "period": strob_period(theta_strob, thetadot_strob, max_period, tol=10**-decimals),
+        }
+
+
+def compute_features(path, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None, **kwargs):
+    """
+    Extracts the features of the selected trajectories (see TrajectoryStore.find)
+    and merges them into the `features` table of the file. Returns the new rows.
+    kwargs are passed on to extract_features.
+    """
+    with TrajectoryStore(path, cache_bytes=0) as store:
+        rows = store.find(alpha, omega, theta0, thetadot0, gamma)
+        table = np.zeros(len(rows), dtype=features_dtype)
+        for name in ("path", "alpha", "omega", "theta0", "thetadot0", "gamma"):
+            table[name] = rows[name]
+        for i, path_i in enumerate(tqdm(rows["path"], desc="Extracting features")):
+            for name, value in extract_features(TrajectoryView(store, path_i).group, **kwargs).items():
+                table[name][i] = value
+
+    with h5py.File(path, "a") as file:
+        old = storage_setup.read_table(file, "features")
+        if old is not None:
+            old = old[~np.isin(old["path"], table["path"])].astype(features_dtype)
+            merged = np.concatenate((old, table))
+        else:
+            merged = table
+        merged = merged[np.lexsort((merged["omega"], merged["alpha"]))]
+        storage_setup.write_table(file, "features", merged, attrs={"n_peaks": n_peaks})
+    return table
+
+
+def load_features(path):
+    """
+    The `features` table of the file at path, or None if it was never computed or does not
+    cover every trajectory of the file (e.g. a later scan added trajectories, run compute_features again).
+    """
+    with h5py.File(path, "r") as file:
+        features = storage_setup.read_table(file, "features")
+        if features is None:
+            return None
+        catalog = storage_setup.read_table(file, "catalog")
+        if catalog is None:
+            catalog = build_catalog(file)
+    if not np.all(np.isin(catalog["path"], features["path"])):
+        return None
+    return features[np.isin(features["path"], catalog["path"])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-trajectory summary features of a trajectory file.")
+    parser.add_argument("file")
+    parser.add_argument("--gamma", type=float, default=None)
+    parser.add_argument("--alpha", type=float, nargs=2, default=None, help="alpha range in degrees")
+    args = parser.parse_args()
+
+    table = compute_features(args.file, alpha=tuple(args.alpha) if args.alpha else None, gamma=args.gamma)
+    print(f"Features of {len(table)} trajectories written to {args.file}/tables/features")
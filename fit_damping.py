@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Estimates the damping gamma (and optionally the effective alpha and hoop
+radius R) of an experimental run from the tracked bead angle.
+
+Candidate parameters are simulated with `time_evolve_rk` from the initial
+conditions of the first tracked samples, at the measured omega, and compared
+with the tracked theta(t) by
+- "trajectory": RMS angle difference over the first `window` seconds (before
+  the simulation and the experiment decorrelate)
+- "spectral": RMS difference of the log power spectra of the whole run (phase
+  insensitive, for long or chaotic runs)
+The fit refines a grid of candidates around the best one over a few rounds.
+Every round is one batch evaluated by a process pool. Evaluations are cached
+in a JSON file, keyed by a hash of the tracked data and the fit settings, so
+repeated fits of the same video only simulate new candidates.
+
+    python fit_damping.py "Tracker - Python Implementation/output/raw_bead_data_20260317_152653A.csv" \
+        --omega-file "Tracker - Python Implementation/output/angular_velocity_file_test1.txt" --alpha 60 --fit gamma
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from multiprocessing import Pool
+import numpy as np
+import matplotlib
+from scipy.signal import welch
+from time_evolution import time_evolve_rk
+from trajectory_store import wrap_theta
+from batch_plot import load_manifest, save_manifest
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/fit_damping/"
+cache_path = "Data/fit_cache.json"
+
+parameter_names = ("gamma", "alpha", "R")
+default_bounds = {"gamma": (0.01, 2.0), "alpha": (0.0, np.pi/2), "R": (0.8*R, 1.2*R)}
+fit_dtype = np.dtype([("gamma", "f8"), ("alpha", "f8"), ("R", "f8"), ("mismatch", "f8")])
+
+
+def simulate(t, omega, theta0, thetadot0, gamma, alpha, R, samples_per_period=8):
+    """theta at the times t (sec, t[0] = 0) from theta0 and thetadot0 (rad/s)."""
+    tau = omega*t
+    _, _, sol = time_evolve_rk(
+            theta0, thetadot0/omega, tau[-1] + 2*np.pi/samples_per_period, alpha, g/(R*omega**2), gamma/omega,
+            samples_per_period=samples_per_period, dense_output=True)
+    return sol(tau)[0]
+
+
+def power_spectrum(t, theta, dt):
+    """Welch power spectrum of theta resampled on a uniform grid of step dt."""
+    uniform = np.arange(t[0], t[-1], dt)
+    return welch(np.interp(uniform, t, theta), fs=1/dt, nperseg=min(len(uniform), 1024), detrend=False)
+
+
+def mismatch(t, theta, theta_sim, metric, f_max):
+    if not np.all(np.isfinite(theta_sim)):
+        return np.inf
+    if metric == "trajectory":
+        return float(np.sqrt(np.mean(wrap_theta(theta_sim - theta)**2)))
+    dt = np.median(np.diff(t))
+    f, power = power_spectrum(t, theta, dt)
+    _, power_sim = power_spectrum(t, theta_sim, dt)
+    band = f <= f_max
+    floor = 1e-12*power[band].max()
+    return float(np.sqrt(np.mean((np.log10(power_sim[band] + floor) - np.log10(power[band] + floor))**2)))
+
+
+def evaluate(args):
+    t, theta, omega, theta0, thetadot0, candidate, metric, window, f_max = args
+    if metric == "trajectory":
+        inside = t <= window
+        t, theta = t[inside], theta[inside]
+    return mismatch(t, theta, simulate(t, omega, theta0, thetadot0, **candidate), metric, f_max)
+
+
+def data_key(t, theta, omega, theta0, thetadot0, metric, window, f_max):
+    """Cache key of a tracked run and the fit settings."""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(t, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(theta, dtype=float).tobytes())
+    h.update(json.dumps([float(omega), float(theta0), float(thetadot0), metric, float(window), float(f_max)]).encode())
+    return h.hexdigest()
+
+
+def candidate_key(candidate):
+    return ",".join(f"{candidate[name]:.12g}" for name in parameter_names)
+
+
+def fit(t, theta, omega, theta0, thetadot0, free=("gamma",), fixed=None, bounds=None, metric="trajectory",
+        window=10.0, f_max=None, n_grid=None, n_rounds=4, shrink=0.3, processes=None, cache_path=cache_path):
+    """
+    Fits the parameters `free` (names of parameter_names) to the tracked theta(t) (t[0] = 0, radians)
+    at the measured omega, from theta0 and thetadot0 (rad/s). The others are taken from `fixed`
+    (defaults gamma = 0.5, alpha = 0, R = 0.355/2). bounds: {name: (min, max)}, see default_bounds.
+    f_max: upper frequency (Hz) of the spectral mismatch, default 5 drive harmonics.
+    n_grid: candidates per free parameter and round, default 9, 5, 4 for 1, 2, 3 free parameters.
+
+    Returns (best, history): the best candidate {name: value, "mismatch": value} and a fit_dtype
+    array of every candidate evaluated.
+    """
+    values = {"gamma": 0.5, "alpha": 0.0, "R": R, **(fixed or dict())}
+    bounds = {**default_bounds, **(bounds or dict())}
+    f_max = 5*omega/(2*np.pi) if f_max is None else f_max
+    n_grid = n_grid or {1: 9, 2: 5}.get(len(free), 4)
+    box = {name: bounds[name] for name in free}
+
+    key = data_key(t, theta, omega, theta0, thetadot0, metric, window, f_max)
+    cache = load_manifest(cache_path) if cache_path else dict()
+    evaluations = cache.setdefault(key, dict())
+
+    pool = None
+    try:
+        for _ in range(n_rounds):
+            axes = [np.linspace(*box[name], n_grid) for name in free]
+            candidates = [{**values, **dict(zip(free, point))} for point in itertools.product(*axes)]
+            missing = [candidate for candidate in candidates if candidate_key(candidate) not in evaluations]
+            if missing:
+                pool = pool or Pool(processes=processes or max(os.cpu_count(), 1))
+                results = pool.map(evaluate, [(t, theta, omega, theta0, thetadot0, candidate, metric, window, f_max)
+                                              for candidate in missing])
+                evaluations.update({candidate_key(c): r for c, r in zip(missing, results)})
+                if cache_path:
+                    save_manifest(cache, cache_path)
+
+            best = min(candidates, key=lambda candidate: evaluations[candidate_key(candidate)])
+            for name in free:
+                half = shrink*(box[name][1] - box[name][0])/2
+                box[name] = (max(best[name] - half, bounds[name][0]), min(best[name] + half, bounds[name][1]))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    history = np.array([(*map(float, k.split(",")), v) for k, v in evaluations.items()], dtype=fit_dtype)
+    return {**best, "mismatch": evaluations[candidate_key(best)]}, history
+
+
+if __name__ == "__main__":
+    from experiment_overlay import load_tracker_csv, initial_conditions, plot_overlay
+    from uncertainty import read_angular_velocity_file
+
+    parser = argparse.ArgumentParser(description="Fit the damping (and alpha, R) to a tracked run.")
+    parser.add_argument("csv", help="Tracker CSV export (Time_s, Raw_Theta_deg, ...)")
+    omega_source = parser.add_mutually_exclusive_group(required=True)
+    omega_source.add_argument("--omega", type=float)
+    omega_source.add_argument("--omega-file", help="Tracker angular_velocity_*.txt")
+    parser.add_argument("--alpha", type=float, default=0.0, help="degrees, used when alpha is not fitted")
+    parser.add_argument("--R", type=float, default=R, help="m, used when R is not fitted")
+    parser.add_argument("--gamma", type=float, default=0.5, help="used when gamma is not fitted")
+    parser.add_argument("--fit", nargs="+", choices=parameter_names, default=["gamma"])
+    parser.add_argument("--metric", choices=("trajectory", "spectral"), default="trajectory")
+    parser.add_argument("--window", type=float, default=10.0, help="sec, trajectory metric")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--grid", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    omega = read_angular_velocity_file(args.omega_file)[0] if args.omega_file else args.omega
+    t, theta = load_tracker_csv(args.csv)
+    t = t - t[0]
+    theta0, thetadot0 = initial_conditions(t, theta)
+
+    best, history = fit(
+            t, theta, omega, theta0, thetadot0, free=tuple(args.fit),
+            fixed={"gamma": args.gamma, "alpha": np.deg2rad(args.alpha), "R": args.R},
+            metric=args.metric, window=args.window, n_grid=args.grid, n_rounds=args.rounds,
+            processes=args.processes, cache_path=None if args.no_cache else cache_path,
+            )
+    print(f"gamma = {best['gamma']:.4f}  alpha = {np.rad2deg(best['alpha']):.2f} deg  R = {best['R']:.4f} m"
+          f"  ({args.metric} mismatch {best['mismatch']:.4g}, {len(history)} evaluations)")
+
+    matplotlib.use("Agg")
+    theta_sim = simulate(t, omega, theta0, thetadot0, best["gamma"], best["alpha"], best["R"])
+    os.makedirs(plots_dir, exist_ok=True)
+    plot_overlay(
+            t, theta, theta_sim, np.full(len(t), omega),
+            title=rf"Best fit: $\gamma={best['gamma']:.4f}\quad \alpha={np.rad2deg(best['alpha']):.2f}^\circ"
+                  rf"\quad R={best['R']:.4f}\,m$",
+            file_name=f"{plots_dir}{os.path.splitext(os.path.basename(args.csv))[0]}_{'_'.join(args.fit)}.jpg",
+            )
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+Harmonic balance for the period-1 (drive period) oscillations of the hoop
+
+    theta'' + B theta' + (A cos(alpha) - cos(theta)) sin(theta) - A sin(alpha) sin(tau) cos(theta) = 0,
+    A = g/(R omega^2),  B = gamma/omega
+
+theta(tau) is expanded in K harmonics of the drive,
+
+    theta(tau) = c_0 + sum_k a_k cos(k tau) + b_k sin(k tau),  x = [c_0, a_1..a_K, b_1..b_K]
+
+and the residual is evaluated on `n_points` collocation points per period
+(irfft), projected back onto the harmonics (rfft) and driven to zero by Newton
+iterations. All (omega, initial guess) pairs are solved together as one batch
+of (2K+1)x(2K+1) linear systems.
+
+Near a resonance the amplitude-frequency curve is multivalued. Every omega is
+therefore started from a set of guesses (offsets c_0 around the hoop times
+first-harmonic amplitudes), and the distinct converged solutions are kept.
+Their stability follows from the Floquet multipliers of the linearisation
+along the solution, integrated for all solutions at once.
+
+Rotating solutions (theta drifting by 2 pi per period) are not of this form and
+are not found.
+
+    >>> table = resonance_curves(np.arange(1, 6, 0.02), alpha=np.deg2rad(22), gamma=0.5)
+    >>> stable = table[table["stable"]]
+    >>> plt.plot(stable["omega"], stable["amplitude"], ".")
+"""
+import argparse
+import os
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from trajectory_store import wrap_theta
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/harmonic_balance/"
+
+
+def basis(K, taus):
+    """Values of the harmonics [1, cos(k tau), sin(k tau)] at taus, shape (len(taus), 2K+1)."""
+    k = np.arange(1, K + 1)
+    return np.concatenate((np.ones((len(taus), 1)), np.cos(np.outer(taus, k)), np.sin(np.outer(taus, k))), axis=1)
+
+
+def to_samples(x, K, n_points):
+    """theta at the n_points collocation points of every row of coefficients x (irfft)."""
+    spectrum = np.zeros(x.shape[:-1] + (n_points//2 + 1,), dtype=complex)
+    spectrum[..., 0] = x[..., 0]*n_points
+    spectrum[..., 1:K + 1] = (x[..., 1:K + 1] - 1j*x[..., K + 1:])*n_points/2
+    return np.fft.irfft(spectrum, n=n_points, axis=-1)
+
+
+def to_coefficients(samples, K):
+    """Projection of samples on the collocation points onto the harmonics (rfft)."""
+    n_points = samples.shape[-1]
+    spectrum = np.fft.rfft(samples, axis=-1)
+    return np.concatenate((
+        spectrum[..., :1].real/n_points,
+        2*spectrum[..., 1:K + 1].real/n_points,
+        -2*spectrum[..., 1:K + 1].imag/n_points,
+        ), axis=-1)
+
+
+def solve(omega, alpha, x0, gamma=0.5, K=8, n_points=64, g=g, R=R, tol=1e-9, max_iter=40):
+    """
+    Newton iterations for a batch of (omega, alpha, initial coefficients x0) at once.
+    omega, alpha: arrays of shape (n,) (or scalars), x0: (n, 2K+1)
+    Returns (x, converged).
+    """
+    x = np.array(x0, dtype=float)
+    n = x.shape[0]
+    omega = np.broadcast_to(omega, (n,))
+    alpha = np.broadcast_to(alpha, (n,))
+    A = g/(R*omega**2)
+    a = (A*np.cos(alpha))[:, None]
+    b = (A*np.sin(alpha))[:, None]
+    B = (gamma/omega)[:, None]
+
+    taus = 2*np.pi*np.arange(n_points)/n_points
+    E = basis(K, taus)
+    P = to_coefficients(np.eye(n_points), K).T  # Samples -> coefficients, P @ E = 1
+    k = np.arange(1, K + 1)
+    # theta'' + B theta' in coefficient space
+    linear = np.zeros((n, 2*K + 1, 2*K + 1))
+    linear[:, 1 + np.arange(K), 1 + np.arange(K)] = -k**2
+    linear[:, K + 1 + np.arange(K), K + 1 + np.arange(K)] = -k**2
+    linear[:, 1 + np.arange(K), K + 1 + np.arange(K)] = B*k
+    linear[:, K + 1 + np.arange(K), 1 + np.arange(K)] = -B*k
+
+    converged = np.zeros(n, dtype=bool)
+    active = np.arange(n)
+    for _ in range(max_iter):
+        theta = to_samples(x[active], K, n_points)
+        sin, cos = np.sin(theta), np.cos(theta)
+        nonlinear = (a[active] - cos)*sin - b[active]*np.sin(taus)*cos
+        dnonlinear = a[active]*cos - np.cos(2*theta) + b[active]*np.sin(taus)*sin
+
+        residual = np.einsum("nij,nj->ni", linear[active], x[active]) + to_coefficients(nonlinear, K)
+
+        error = np.max(np.abs(residual), axis=1)
+        done = error < tol
+        converged[active[done]] = True
+        keep = ~done & (error < 1e3)  # Also drop the diverging guesses
+        active, residual, dnonlinear = active[keep], residual[keep], dnonlinear[keep]
+        if len(active) == 0:
+            break
+        # Projection of dnonlinear times every harmonic, as a batched matrix product
+        jacobian = linear[active] + (P[None]*dnonlinear[:, None, :]) @ E
+        try:
+            step = np.linalg.solve(jacobian, residual[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = np.stack([np.linalg.lstsq(j, r, rcond=None)[0] for j, r in zip(jacobian, residual)])
+        # Damped steps, at most 1 rad per coefficient
+        step *= np.minimum(1, 1/np.max(np.abs(step), axis=1, keepdims=True))
+        x[active] -= step
+    x[~np.isfinite(x).all(axis=1)] = np.nan
+    return x, converged
+
+
+def floquet_multipliers(x, omega, alpha, gamma=0.5, K=8, g=g, R=R, n_steps=256):
+    """
+    Floquet multipliers (n, 2) of the period-1 solutions x, from RK4 integration of the
+    linearised equation over one drive period, for all solutions at once.
+    """
+    n = x.shape[0]
+    A = g/(R*np.broadcast_to(omega, (n,))**2)
+    a = (A*np.cos(alpha))[:, None, None]
+    b = (A*np.sin(alpha))[:, None, None]
+    B = (gamma/np.broadcast_to(omega, (n,)))[:, None, None]
+
+    h = 2*np.pi/n_steps
+    taus = h/2*np.arange(2*n_steps + 1)  # Steps and half steps
+    theta = x @ basis(K, taus).T
+    stiffness = a*np.cos(theta)[:, :, None] - np.cos(2*theta)[:, :, None] + b*(np.sin(taus)[None, :, None]*np.sin(theta)[:, :, None])
+
+    def rhs(phi, i):
+        # phi: (n, 2, 2) fundamental matrix, rows (dtheta, dtheta')
+        return np.stack((phi[:, 1], -stiffness[:, i]*phi[:, 0] - B[:, 0]*phi[:, 1]), axis=1)
+
+    phi = np.broadcast_to(np.eye(2), (n, 2, 2)).copy()
+    for step in range(n_steps):
+        i = 2*step
+        k1 = rhs(phi, i)
+        k2 = rhs(phi + h/2*k1, i + 1)
+        k3 = rhs(phi + h/2*k2, i + 1)
+        k4 = rhs(phi + h*k3, i + 2)
+        phi = phi + h/6*(k1 + 2*k2 + 2*k3 + k4)
+    return np.linalg.eigvals(phi)
+
+
+def resonance_curves(omegas, alpha, gamma=0.5, K=8, n_points=64, coarse_step=10, n_offsets=8,
+                     amplitudes=(0.1, 0.5, 1.0, 2.0), g=g, R=R):
+    """
+    All period-1 solutions found for every omega of the grid `omegas` (alpha in radians).
+    The solutions are first searched from many guesses on every `coarse_step`-th omega,
+    then every solution is continued to the neighbouring omegas, all branches in one
+    batch per step, until no new solutions turn up.
+    Returns a structured array, one row per distinct solution, sorted by omega:
+    omega, amplitude (max - min of theta wrapped to [-pi, pi), as in features.py), mean,
+    stable, max_multiplier, coefficients.
+    """
+    omegas = np.asarray(omegas, dtype=float)
+
+    # Initial guesses: offsets around the hoop times first harmonic amplitudes and phases
+    offsets = 2*np.pi*np.arange(n_offsets)/n_offsets - np.pi
+    guesses = list()
+    for c0 in offsets:
+        for r in amplitudes:
+            for phase in (0, np.pi/2):
+                guess = np.zeros(2*K + 1)
+                guess[0] = c0
+                guess[1] = r*np.cos(phase)
+                guess[K + 1] = r*np.sin(phase)
+                guesses.append(guess)
+    guesses = np.array(guesses)
+
+    found = dict()  # (omega index, rounded offset direction and leading harmonics) -> solution
+
+    def add(index, x, converged):
+        # Keeps the distinct new solutions and returns them, the frontier of the continuation
+        frontier_index, frontier_x = list(), list()
+        for i, xi in zip(index[converged], x[converged]):
+            xi[0] = wrap_theta(xi[0])
+            key = (i, *np.round(np.r_[np.cos(xi[0]), np.sin(xi[0]), xi[1:3], xi[K + 1:K + 3]], 4) + 0.0)
+            if key not in found:
+                found[key] = xi
+                frontier_index.append(i)
+                frontier_x.append(xi)
+        return np.array(frontier_index, dtype=int), np.array(frontier_x).reshape(-1, 2*K + 1)
+
+    # Search from many guesses on the coarse grid
+    coarse = np.arange(0, len(omegas), coarse_step)
+    index = np.repeat(coarse, len(guesses))
+    x, converged = solve(omegas[index], alpha, np.tile(guesses, (len(coarse), 1)), gamma, K, n_points, g, R)
+    frontier_index, frontier_x = add(index, x, converged)
+
+    # Continue every new solution one omega step up and down
+    while len(frontier_index):
+        index = np.concatenate((frontier_index - 1, frontier_index + 1))
+        x0 = np.concatenate((frontier_x, frontier_x))
+        inside = (index >= 0) & (index < len(omegas))
+        index, x0 = index[inside], x0[inside]
+        x, converged = solve(omegas[index], alpha, x0, gamma, K, n_points, g, R, max_iter=15)
+        frontier_index, frontier_x = add(index, x, converged)
+
+    keys = list(found)
+    omega = omegas[[key[0] for key in keys]]
+    x = np.array([found[key] for key in keys]).reshape(-1, 2*K + 1)
+
+    multipliers = floquet_multipliers(x, omega, alpha, gamma, K, g, R)
+    theta = wrap_theta(to_samples(x, K, n_points))
+
+    table = np.zeros(len(omega), dtype=[
+        ("omega", float),
+        ("amplitude", float),
+        ("mean", float),
+        ("stable", bool),
+        ("max_multiplier", float),
+        ("coefficients", float, (2*K + 1,)),
+        ])
+    table["omega"] = omega
+    table["amplitude"] = theta.max(axis=1) - theta.min(axis=1)
+    table["mean"] = x[:, 0]
+    table["max_multiplier"] = np.max(np.abs(multipliers), axis=1)
+    table["stable"] = table["max_multiplier"] < 1
+    table["coefficients"] = x
+    return table[np.argsort(table["omega"], kind="stable")]
+
+
+def plot_resonance_curves(table, alpha_deg, gamma, file_name=None):
+    stable = table[table["stable"]]
+    unstable = table[~table["stable"]]
+    plt.figure()
+    plt.scatter(unstable["omega"], unstable["amplitude"], s=2, color="tab:red", label="unstable")
+    plt.scatter(stable["omega"], stable["amplitude"], s=4, color="black", label="stable")
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel(r"$A=\theta_\max-\theta_\min$")
+    plt.ylim(-0.25, 2*np.pi+0.25)
+    plt.title("Harmonic balance, period-1 solutions"
+              "\n" rf"$\alpha={alpha_deg:05.2f}^\circ\quad \gamma={gamma}$")
+    plt.legend()
+    if file_name:
+        plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close()
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description="Period-1 amplitude-frequency curves by harmonic balance.")
+    parser.add_argument("alpha", type=float, nargs="+", help="degrees")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--harmonics", type=int, default=8)
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    os.makedirs(plots_dir, exist_ok=True)
+    omegas = np.arange(1, 6, 0.02)
+    for alpha in args.alpha:
+        t0 = perf_counter()
+        table = resonance_curves(omegas, np.deg2rad(alpha), args.gamma, K=args.harmonics)
+        print(f"alpha = {alpha}: {len(table)} solutions ({np.sum(table['stable'])} stable) in {perf_counter() - t0:.2f} sec")
+        plot_resonance_curves(table, alpha, args.gamma, file_name=f"{plots_dir}{alpha:05.2f}.jpg")
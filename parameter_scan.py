@@ -5,11 +5,13 @@ import numpy as np
 import h5py
 from tqdm import tqdm
 from time_evolution import time_evolve_rk
+from trajectory_store import build_catalog
 import storage_setup
 
 discard_tau = 100*2*np.pi
 data_tau = 400*2*np.pi
 samples_per_period = 64
+energy_tol = 1e-4  # Runs whose relative energy balance residual exceeds this are flagged (energy_suspect)
 
 g = 9.8
 R = 0.355/2
@@ -20,15 +22,18 @@ def compute_rk(params):
     A = g/(R * omega**2)
     B = gamma/omega
 
-    uniform = time_evolve_rk(
+    *uniform, crossings, energy = time_evolve_rk(
             theta0, thetadot0, data_tau,
             alpha, A, B,
             discard_tau = discard_tau,
             gamma=gamma,
             samples_per_period=samples_per_period,
+            count_crossings=True,
+            monitor_energy=True,
+            energy_tol=energy_tol,
             )
 
-    return uniform, alpha, omega, gamma
+    return uniform, {**crossings, **energy}, alpha, omega, gamma
 
 # def compute_verlet(params):
 #     alpha, omega, theta0, p0, dt, gamma = params
@@ -51,56 +56,123 @@ def init_worker():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
 
 
-def param_scan(theta0, thetadot0, alphas_omegas, gamma=0):
-
-    param_list = [(a,w, theta0, thetadot0, gamma) for a,w in alphas_omegas]
+def is_complete(parent, name):
+    """True if parent[name] is a trajectory group with a non-empty theta (theta is written last)."""
+    return name in parent and "theta" in parent[name] and parent[name]["theta"].shape[0] > 0
+
+
+def prepare_trajectory_groups(file, param_list, storage_profile, overwrite=False):
+    """
+    Creates the groups and empty datasets of every trajectory in param_list, so that
+    the file can be switched to SWMR mode before any trajectory is computed.
+    Complete trajectories already in the file are kept (and not recomputed) unless overwrite is True.
+    Returns a dictionary {(alpha, omega, gamma): trajectory group} of the trajectories to compute.
+    """
+    N = int(data_tau/(2*np.pi/samples_per_period))
+    trajectory_grps = dict()
+    for alpha, omega, theta0, thetadot0, gamma in tqdm(param_list, desc="Preparing file"):
+        alpha_grp = storage_setup.get_or_create_group(file, storage_setup.alpha_key(np.rad2deg(alpha)), attrs={"alpha":alpha})
+        omega_grp = storage_setup.get_or_create_group(alpha_grp, storage_setup.omega_key(omega), attrs={"omega":omega})
+
+        key = storage_setup.trajectory_key(np.rad2deg(theta0), thetadot0, gamma)
+        if not overwrite and is_complete(omega_grp, key):
+            continue
+        uniform_grp =storage_setup.get_or_create_group(omega_grp, key, attrs={ 
+            "theta0": theta0,
+            "thetadot0": thetadot0,
+            "gamma": gamma,
+            "samples_per_period": samples_per_period,
+            "storage_profile": storage_profile,
+            # Placeholders, attributes can only be modified, not created, in SWMR mode
+            "rotation_number": np.nan,
+            "crossings_forward": np.int64(-1),
+            "crossings_backward": np.int64(-1),
+            "turning_points": np.int64(-1),
+            "energy_drift": np.nan,
+            "energy_drift_rate": np.nan,
+            "energy_suspect": np.False_,
+            "energy_tol": energy_tol,
+            })
+
+        for name in ("tau", "thetadot", "theta"):
+            storage_setup.create_empty_dataset(uniform_grp, name, max_length=N, profile=storage_profile)
+        trajectory_grps[(alpha, omega, gamma)] = uniform_grp
+    return trajectory_grps
+
+
+def param_scan(theta0, thetadot0, alphas_omegas, gamma=0, storage_profile=None, swmr=True, overwrite=False):
+    """
+    Solves the trajectories for every (alpha, omega, gamma) combination and writes them to the data file.
+    gamma: one value or a list of values, all scanned by the same pool of workers.
+           The file is Data/trajectories.h5 if every gamma is 0, Data/dissip_trajectories.h5 otherwise.
+    storage_profile: name of the storage profile (see storage_setup.STORAGE_PROFILES) used
+                     for the datasets. If None, the profile stored in the file is used.
+    swmr: if True the file is written in single-writer/multiple-reader mode, so it can be
+          read (with swmr=True) while the scan is running.
+    overwrite: if True trajectories already in the file are computed again, otherwise only
+               the missing (or incomplete, e.g. after an interrupted scan) ones are computed.
+    """
+
+    # The values as passed: trajectory_key formats gamma as is (0 and 0.0 are different groups)
+    gammas = list(gamma) if np.ndim(gamma) else [gamma]
+    param_list = [(a,w, theta0, thetadot0, g) for g in gammas for a,w in alphas_omegas]
 
     pool = Pool(processes=max(os.cpu_count(),1) , initializer=init_worker)
     #pool = Pool(processes=max(os.cpu_count()-1,1) , initializer=init_worker)
 
     try:
-        if gamma == 0:
+        if not any(gammas):
+            # DOP853 with the energy balance monitor (energy_suspect) instead of velocity verlet
             file_path = "Data/trajectories.h5"
-            print("Non-dissipative case not Implemented.")
-            raise NotImplementedError
         else:
             file_path = "Data/dissip_trajectories.h5"
 
-        with h5py.File(file_path, "a") as file:
-            if gamma == 0:
-                worker = compute_verlet
-                print("Using velocity verlet")
-            else:
-                worker = compute_rk
-                print("Using DOP853")
-
-            for uniform, alpha, omega, gamma in tqdm(
+        with h5py.File(file_path, "a", libver="latest") as file:
+            storage_profile, _ = storage_setup.get_storage_profile(file, storage_profile)
+            file.attrs["storage_profile"] = storage_profile
+            # Stale until the scan is complete, readers walk the groups meanwhile
+            if "tables/catalog" in file:
+                del file["tables/catalog"]
+
+            trajectory_grps = prepare_trajectory_groups(file, param_list, storage_profile, overwrite)
+            param_list = [params for params in param_list if (params[0], params[1], params[4]) in trajectory_grps]
+            # Features of recomputed trajectories are stale, new ones have none (see features.load_features)
+            features = storage_setup.read_table(file, "features")
+            if features is not None:
+                recomputed = [grp.name for grp in trajectory_grps.values()]
+                storage_setup.write_table(file, "features", features[~np.isin(features["path"], recomputed)],
+                                          attrs=dict(file["tables/features"].attrs))
+            print(f"{len(param_list)} trajectories to compute")
+            if swmr:
+                file.swmr_mode = True
+                print(f"{file_path} is open in SWMR mode")
+
+            worker = compute_rk
+            print("Using DOP853")
+
+            for uniform, diagnostics, alpha, omega, gamma in tqdm(
                     pool.imap_unordered(worker, param_list),
                     total=len(param_list),
                     desc="Computing trajectories"
                     ):
 
-                alpha_grp = storage_setup.get_or_create_group(file, f"alpha{np.rad2deg(alpha):05.2f}", attrs={"alpha":alpha})
-                omega_grp = storage_setup.get_or_create_group(alpha_grp, f"omega{omega:06.3f}", attrs={"omega":omega})
+                uniform_grp = trajectory_grps[(alpha, omega, gamma)]
 
-                uniform_grp =storage_setup.get_or_create_group(omega_grp, f"uniform{np.rad2deg(theta0):04.1f}_{thetadot0:04.1f}_{gamma}", attrs={ 
-                    "theta0": theta0,
-                    "thetadot0": thetadot0,
-                    "gamma": gamma,
-                    "samples_per_period": samples_per_period,
-                    })
-
-                storage_setup.create_or_overwrite_dataset(uniform_grp, "tau", uniform[0])
-                storage_setup.create_or_overwrite_dataset(
-                        uniform_grp, "theta", uniform[1][0]
-                        )
-                storage_setup.create_or_overwrite_dataset(
-                        uniform_grp, "thetadot", uniform[1][1]
-                        )
+                for name, value in diagnostics.items():
+                    uniform_grp.attrs.modify(name, value)
+                # theta is written last: a non-empty theta marks a complete trajectory for readers
+                storage_setup.fill_dataset(uniform_grp["tau"], uniform[0])
+                storage_setup.fill_dataset(uniform_grp["thetadot"], uniform[1][1])
+                storage_setup.fill_dataset(uniform_grp["theta"], uniform[1][0])
+                file.flush()
 
             pool.close()
             pool.join()
 
+        # A new dataset cannot be created in SWMR mode
+        with h5py.File(file_path, "a", libver="latest") as file:
+            storage_setup.write_table(file, "catalog", build_catalog(file))
+
     except KeyboardInterrupt:
         print("\nInterrupted by user. Terminating workers...")
         pool.terminate()
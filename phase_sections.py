@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+Poincaré sections at an arbitrary drive phase phi, i.e. the points
+(theta, thetadot) at tau = 2 pi n + phi, instead of only at the multiples of
+2 pi/samples_per_period stored by `param_scan`.
+
+Stored trajectories are interpolated with piecewise quintic Hermite
+polynomials. Between two samples the polynomial matches theta and its first
+two derivatives at both ends, and the derivatives follow from the equation of
+motion, so nothing beyond the stored samples is needed and nothing is
+re-integrated:
+
+    theta''  = -B theta' - (a - cos(theta)) sin(theta) + b sin(tau) cos(theta)
+    theta''' = -B theta'' - theta' (a cos(theta) - cos(2 theta)) + b (cos(tau) cos(theta) - sin(tau) sin(theta) theta')
+
+with a = A cos(alpha), b = A sin(alpha), A = g/(R omega^2) and B = gamma/omega. The
+error is O(dtau^6). Freshly integrated trajectories can use the solver's own
+interpolant instead (`time_evolve_rk(..., dense_output=True)` and `dense_sections`).
+
+Sections for many phases are extracted in one vectorized call, which makes
+animating the deformation of the section over phi in [0, 2 pi) cheap:
+
+    python phase_sections.py Data/dissip_trajectories.h5 --alpha 60 --omega 5.8
+
+The same interpolant gives sections on a surface of the state space instead of
+the drive phase, theta' = value or theta = value (mod 2 pi), more informative at
+small alpha, where the motion is nearly autonomous. `find_crossings` brackets
+the crossings between samples of a whole batch of trajectories at once and
+refines all of them together by bisection on the Hermite polynomials;
+`store_crossings` does it for trajectories of a file. Freshly integrated
+trajectories can record them with solver events instead
+(`time_evolve_rk(..., section=("thetadot", 0.0))`):
+
+    python phase_sections.py Data/dissip_trajectories.h5 --alpha 5 --omega 5.8 --section thetadot --direction -1
+"""
+import argparse
+import os
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation, PillowWriter
+from trajectory_store import TrajectoryStore, TrajectoryView, wrap_theta
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/phase_sections/"
+
+crossing_dtype = np.dtype([("trajectory", np.int64), ("tau", float), ("theta", float), ("thetadot", float)])
+
+
+def derivatives(tau, theta, thetadot, alpha, A, B):
+    """theta'' and theta''' (in tau) from the equation of motion."""
+    a = A*np.cos(alpha)
+    b = A*np.sin(alpha)
+    thetaddot = -B*thetadot - (a - np.cos(theta))*np.sin(theta) + b*np.sin(tau)*np.cos(theta)
+    thetadddot = (
+        - B*thetaddot
+        - thetadot*(a*np.cos(theta) - np.cos(2*theta))
+        + b*(np.cos(tau)*np.cos(theta) - np.sin(tau)*np.sin(theta)*thetadot)
+        )
+    return thetaddot, thetadddot
+
+
+def quintic_hermite(s, h, y0, d0, c0, y1, d1, c1):
+    """Quintic matching value, first and second derivative at both ends of intervals of length h, at s in [0, 1]."""
+    s2 = s*s
+    s3 = s2*s
+    s4 = s3*s
+    s5 = s4*s
+    return (
+        y0*(1 - 10*s3 + 15*s4 - 6*s5)
+        + h*d0*(s - 6*s3 + 8*s4 - 3*s5)
+        + h*h*c0*(0.5*s2 - 1.5*s3 + 1.5*s4 - 0.5*s5)
+        + y1*(10*s3 - 15*s4 + 6*s5)
+        + h*d1*(-4*s3 + 7*s4 - 3*s5)
+        + h*h*c1*(0.5*s3 - s4 + 0.5*s5)
+        )
+
+
+def section_taus(tau_start, tau_stop, phases):
+    """tau = 2 pi n + phase within [tau_start, tau_stop], shape (n_phases, n_periods) (NaN padded)."""
+    phases = np.atleast_1d(phases) % (2*np.pi)
+    n = np.arange(np.floor(tau_start/(2*np.pi)), np.ceil(tau_stop/(2*np.pi)) + 1)
+    taus = 2*np.pi*n[None, :] + phases[:, None]
+    inside = (taus >= tau_start) & (taus <= tau_stop)
+    # Drop the periods missing for every phase
+    keep = np.any(inside, axis=0)
+    return np.where(inside, taus, np.nan)[:, keep]
+
+
+def hermite_sections(tau, theta, thetadot, phases, alpha, A, B):
+    """
+    Sections of a uniformly sampled trajectory at the drive phases `phases` (radians, array).
+    Returns (theta, thetadot) of shape (n_phases, n_periods), theta unwrapped, NaN where a
+    phase falls outside the sampled range for that period.
+    """
+    h = tau[1] - tau[0]
+    thetaddot, thetadddot = derivatives(tau, theta, thetadot, alpha, A, B)
+
+    taus = section_taus(tau[0], tau[-1], phases)
+    valid = ~np.isnan(taus)
+    position = (np.where(valid, taus, tau[0]) - tau[0])/h
+    i = np.clip(np.floor(position).astype(int), 0, len(tau) - 2)
+    s = position - i
+
+    theta_section = quintic_hermite(s, h, theta[i], thetadot[i], thetaddot[i],
+                                    theta[i + 1], thetadot[i + 1], thetaddot[i + 1])
+    thetadot_section = quintic_hermite(s, h, thetadot[i], thetaddot[i], thetadddot[i],
+                                       thetadot[i + 1], thetaddot[i + 1], thetadddot[i + 1])
+    return np.where(valid, theta_section, np.nan), np.where(valid, thetadot_section, np.nan)
+
+
+def dense_sections(sol, tau_start, tau_stop, phases):
+    """Sections from the OdeSolution of time_evolve_rk(..., dense_output=True); same output as hermite_sections."""
+    taus = section_taus(tau_start, tau_stop, phases)
+    valid = ~np.isnan(taus)
+    y = sol(taus[valid])
+    theta = np.full(taus.shape, np.nan)
+    thetadot = np.full(taus.shape, np.nan)
+    theta[valid] = y[0]
+    thetadot[valid] = y[1]
+    return theta, thetadot
+
+
+def trajectory_sections(trjy, phases, g=g, R=R):
+    """Sections of a stored trajectory (a TrajectoryView) at the drive phases `phases`."""
+    attrs = trjy.attrs
+    A = g/(R*attrs["omega"]**2)
+    B = attrs.get("gamma", 0)/attrs["omega"]
+    return hermite_sections(trjy.tau, trjy.theta, trjy.thetadot, phases, attrs["alpha"], A, B)
+
+
+def surface_function(theta, thetadot, surface, value):
+    """Signed distance to the section surface, continuous across it."""
+    if surface == "thetadot":
+        return thetadot - value
+    if surface == "theta":
+        return wrap_theta(theta - value)
+    raise ValueError(f"Unknown section surface {surface!r}. Use 'thetadot' or 'theta'")
+
+
+def find_crossings(tau, theta, thetadot, alpha, A, B, surface="thetadot", value=0.0, direction=0, n_bisections=40):
+    """
+    Crossings of the surface theta' = value (surface="thetadot") or theta = value mod 2 pi
+    (surface="theta") by a batch of uniformly sampled trajectories.
+    tau: (n_samples,) common sample times; theta, thetadot: (n_trajectories, n_samples)
+    alpha, A, B: scalars or (n_trajectories,) arrays
+    direction: +1 (increasing), -1 (decreasing) or 0 (both) crossings
+    Returns a structured array of crossing_dtype, sorted by trajectory and tau; theta unwrapped.
+    """
+    theta, thetadot = np.atleast_2d(theta), np.atleast_2d(thetadot)
+    alpha, A, B = (np.broadcast_to(np.asarray(x, dtype=float), (len(theta),))[:, None] for x in (alpha, A, B))
+    h = tau[1] - tau[0]
+    thetaddot, thetadddot = derivatives(tau, theta, thetadot, alpha, A, B)
+
+    distance = surface_function(theta, thetadot, surface, value)
+    lo, hi = distance[:, :-1], distance[:, 1:]
+    # A sample exactly on the surface belongs to the <= 0 side, so that each root is bracketed once
+    crossing = ((lo <= 0) != (hi <= 0)) & (np.abs(hi - lo) < np.pi)  # not the jump of a wrapped theta
+    if direction > 0:
+        crossing &= hi > lo
+    elif direction < 0:
+        crossing &= hi < lo
+    row, i = np.nonzero(crossing)
+
+    def interpolate(s):
+        theta_s = quintic_hermite(s, h, theta[row, i], thetadot[row, i], thetaddot[row, i],
+                                  theta[row, i + 1], thetadot[row, i + 1], thetaddot[row, i + 1])
+        thetadot_s = quintic_hermite(s, h, thetadot[row, i], thetaddot[row, i], thetadddot[row, i],
+                                     thetadot[row, i + 1], thetaddot[row, i + 1], thetadddot[row, i + 1])
+        return theta_s, thetadot_s
+
+    # Bisection of every bracket at once
+    s_lo = np.zeros(len(row))
+    s_hi = np.ones(len(row))
+    side_lo = lo[row, i] <= 0
+    for _ in range(n_bisections):
+        s = (s_lo + s_hi)/2
+        same = (surface_function(*interpolate(s), surface, value) <= 0) == side_lo
+        s_lo = np.where(same, s, s_lo)
+        s_hi = np.where(same, s_hi, s)
+    s = (s_lo + s_hi)/2
+
+    crossings = np.empty(len(row), dtype=crossing_dtype)
+    crossings["trajectory"] = row
+    crossings["tau"] = tau[i] + s*h
+    crossings["theta"], crossings["thetadot"] = interpolate(s)
+    return crossings
+
+
+def store_crossings(store, paths, surface="thetadot", value=0.0, direction=0, g=g, R=R):
+    """
+    find_crossings for the trajectories `paths` of a TrajectoryStore, batched by length.
+    The "trajectory" field indexes paths.
+    """
+    views = [TrajectoryView(store, path) for path in paths]
+    by_length = dict()
+    for index, view in enumerate(views):
+        by_length.setdefault(len(view.tau), list()).append(index)
+
+    results = list()
+    for indices in by_length.values():
+        attrs = [views[k].attrs for k in indices]
+        omega = np.array([a["omega"] for a in attrs])
+        crossings = find_crossings(
+                views[indices[0]].tau,
+                np.array([views[k].theta for k in indices]),
+                np.array([views[k].thetadot for k in indices]),
+                np.array([a["alpha"] for a in attrs]),
+                g/(R*omega**2),
+                np.array([a.get("gamma", 0) for a in attrs])/omega,
+                surface, value, direction,
+                )
+        crossings["trajectory"] = np.asarray(indices)[crossings["trajectory"]]
+        results.append(crossings)
+    crossings = np.concatenate(results) if results else np.empty(0, dtype=crossing_dtype)
+    return crossings[np.lexsort((crossings["tau"], crossings["trajectory"]))]
+
+
+def plot_crossings(crossings, surface, value, title="", file_name=None):
+    """Section points: thetadot vs time on theta = value, theta (wrapped) vs thetadot on thetadot = value."""
+    fig, ax = plt.subplots()
+    if surface == "theta":
+        ax.scatter(crossings["tau"]/(2*np.pi), crossings["thetadot"], s=1, color="black")
+        ax.set_xlabel("Drive periods")
+        ax.set_ylabel(rf"$\dot\theta$ at $\theta = {np.rad2deg(value):.1f}^\circ$")
+    else:
+        ax.scatter(wrap_theta(crossings["theta"]), crossings["tau"] % (2*np.pi), s=1, color="black")
+        ax.set_xlabel(rf"$\theta\;(rad)$ at $\dot\theta = {value}$")
+        ax.set_ylabel(r"Drive phase $\tau$ mod $2\pi$")
+        ax.set_xlim(-np.pi, np.pi)
+    ax.set_title(title)
+    if file_name:
+        fig.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+    else:
+        plt.show()
+    plt.close(fig)
+
+
+def animate_sections(trjy, file_name, n_frames=128, fps=24):
+    """Animates the section of a stored trajectory as the drive phase sweeps 0 -> 2 pi."""
+    phases = 2*np.pi*np.arange(n_frames)/n_frames
+    theta, thetadot = trajectory_sections(trjy, phases)
+    theta = wrap_theta(theta)
+
+    attrs = trjy.attrs
+    fig, ax = plt.subplots()
+    points = ax.scatter(theta[0], thetadot[0], s=2)
+    ax.set_xlim(-np.pi, np.pi)
+    ax.set_ylim(np.nanmin(thetadot) - 0.1, np.nanmax(thetadot) + 0.1)
+    ax.set_xlabel(r"$\theta\;(rad)$")
+    ax.set_ylabel(r"$\dot\theta$")
+    title = ax.set_title("")
+
+    def update(frame):
+        points.set_offsets(np.column_stack((theta[frame], thetadot[frame])))
+        title.set_text(
+            "Poincaré section at drive phase " rf"$\phi = {np.rad2deg(phases[frame]):05.1f}^\circ$"
+            "\n" rf"$\alpha = {np.rad2deg(attrs['alpha']):.1f}^\circ,\ \omega = {attrs['omega']:.2f}\,rad/s,\ \gamma = {attrs.get('gamma', 0)}$"
+            )
+        return points, title
+
+    animation = FuncAnimation(fig, update, frames=n_frames, blit=False)
+    animation.save(file_name, writer=PillowWriter(fps=fps))
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Animate the Poincaré section of a trajectory over the drive phase.")
+    parser.add_argument("file")
+    parser.add_argument("--alpha", type=float, required=True, help="degrees")
+    parser.add_argument("--omega", type=float, required=True)
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=0.0)
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--frames", type=int, default=128)
+    parser.add_argument("--section", choices=("thetadot", "theta"), default=None,
+                        help="Section on a state space surface instead of the drive phase animation")
+    parser.add_argument("--value", type=float, default=0.0, help="thetadot, or theta in degrees, of the section")
+    parser.add_argument("--direction", type=int, choices=(-1, 0, 1), default=0)
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    os.makedirs(plots_dir, exist_ok=True)
+    with TrajectoryStore(args.file) as store:
+        trjy = store.get(args.alpha, args.omega, ic=(args.theta0, args.thetadot0), gamma=args.gamma)
+        if args.section:
+            value = np.deg2rad(args.value) if args.section == "theta" else args.value
+            crossings = store_crossings(store, [trjy.path], args.section, value, args.direction)
+            file_name = f"{plots_dir}{args.alpha:05.2f}_{args.omega:06.3f}_{args.section}_{args.value}.jpg"
+            plot_crossings(crossings, args.section, value, file_name=file_name,
+                           title=rf"$\alpha = {args.alpha:.1f}^\circ,\ \omega = {args.omega:.2f}\,rad/s,\ \gamma = {args.gamma}$")
+        else:
+            file_name = f"{plots_dir}{args.alpha:05.2f}_{args.omega:06.3f}.gif"
+            animate_sections(trjy, file_name, n_frames=args.frames)
+        print(file_name)
@@ -2,6 +2,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import h5py
+import equilibrium_surface
 
 dissip = "dissip_"  # Valid values are either an empty string or "dissip_"
 data_file_path = f"Data/{dissip}trajectories.h5"
@@ -13,6 +14,9 @@ alphas_deg = [60]
 #omegas = np.arange(4.0,5.01, 0.02)
 omegas = [5.80, 5.82]
 
+# Quasi-static equilibria theta*(omega*t, omega, alpha) overlaid on the time series
+surface = equilibrium_surface.load_or_compute()
+
 with h5py.File(data_file_path, "r") as file:
     for alpha_val in alphas_deg:
         for omega in omegas:
@@ -62,6 +66,15 @@ with h5py.File(data_file_path, "r") as file:
                     t = [n*dt for n in range(len(theta))]
                 plt.figure(figsize=(10,7))
                 plt.plot(t, theta)
+                if "dissip" in data_file_path:
+                    # Stable equilibria solid, unstable dotted, repeated every 2 pi over the range of theta
+                    eq_theta, eq_stable = surface.query(t, omega, alpha)
+                    eq_theta[1:][np.abs(np.diff(eq_theta, axis=0)) > np.pi] = np.nan  # Break the lines at the wrap
+                    ylim = plt.ylim()
+                    for k in range(int(np.floor(np.min(theta)/(2*np.pi))), int(np.ceil(np.max(theta)/(2*np.pi))) + 1):
+                        plt.plot(t, np.where(eq_stable, eq_theta + 2*np.pi*k, np.nan), color="tab:green", lw=0.6)
+                        plt.plot(t, np.where(eq_stable, np.nan, eq_theta + 2*np.pi*k), color="tab:red", lw=0.6, ls=":")
+                    plt.ylim(ylim)
                 plt.xlabel(r"$t\,(sec)$")
                 plt.ylabel(r"$\theta\,(rad)$")
                 #plt.ylim(-np.pi, np.pi)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Exports the stroboscopic (Poincaré) points of a trajectory file to flat `.npy`
+arrays that can be memory mapped, so the full (alpha, omega, theta_strob)
+point cloud reopens in milliseconds without touching HDF5.
+
+An export directory contains
+
+    theta.npy, thetadot.npy   concatenated stroboscopic points (theta wrapped to [-pi, pi))
+    alpha.npy, omega.npy      parameter coordinates of every point (alpha in degrees)
+    index.npy                 one row per trajectory: alpha, omega, theta0, thetadot0,
+                              gamma and the [start, stop) offsets of its points
+
+    >>> cloud = load_poincare("Data/poincare_export")
+    >>> plt.scatter(cloud.omega, cloud.theta, s=0.1)          # whole cloud, zero copies
+    >>> theta, thetadot = cloud.points(22, 1.5)               # one section by offsets
+
+Usage:
+    python poincare_export.py Data/dissip_trajectories.h5 Data/poincare_export --gamma 0.5
+"""
+import argparse
+import os
+import numpy as np
+from trajectory_store import TrajectoryStore, TrajectoryView, select, wrap_theta
+
+index_dtype = np.dtype([
+    ("alpha", float),  # degrees
+    ("omega", float),
+    ("theta0", float),  # degrees
+    ("thetadot0", float),
+    ("gamma", float),
+    ("start", np.int64),
+    ("stop", np.int64),
+    ])
+
+
+def export_poincare(store_path, out_dir, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None,
+                    dtype=np.float64):
+    """
+    Writes the stroboscopic points of the selected trajectories (see
+    TrajectoryStore.find for the selections) to out_dir. The output arrays are
+    sized from the dataset shapes and filled one trajectory at a time.
+    Returns the index array.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with TrajectoryStore(store_path, cache_bytes=0) as store:
+        rows = store.find(alpha, omega, theta0, thetadot0, gamma)
+        if len(rows) == 0:
+            raise ValueError(f"No trajectories in {store_path} match the selection")
+        views = [TrajectoryView(store, path) for path in rows["path"]]
+
+        lengths = [-(-v.group["theta"].shape[0] // v.samples_per_period) for v in views]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        total = int(offsets[-1])
+
+        index = np.empty(len(rows), dtype=index_dtype)
+        for name in ("alpha", "omega", "theta0", "thetadot0", "gamma"):
+            index[name] = rows[name]
+        index["start"] = offsets[:-1]
+        index["stop"] = offsets[1:]
+
+        out = {
+            name: np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+", dtype=dtype, shape=(total,))
+            for name in ("theta", "thetadot", "alpha", "omega")
+            }
+        for row, view, start, stop in zip(index, views, index["start"], index["stop"]):
+            theta, thetadot = view.poincare(wrap=False)
+            out["theta"][start:stop] = wrap_theta(theta)
+            out["thetadot"][start:stop] = thetadot
+            out["alpha"][start:stop] = row["alpha"]
+            out["omega"][start:stop] = row["omega"]
+        for array in out.values():
+            array.flush()
+
+    np.save(os.path.join(out_dir, "index.npy"), index)
+    return index
+
+
+class PoincareCloud:
+    """
+    Memory mapped Poincaré export (see load_poincare).
+    """
+    def __init__(self, out_dir, mmap_mode="r"):
+        self.index = np.load(os.path.join(out_dir, "index.npy"))
+        self.theta = np.load(os.path.join(out_dir, "theta.npy"), mmap_mode=mmap_mode)
+        self.thetadot = np.load(os.path.join(out_dir, "thetadot.npy"), mmap_mode=mmap_mode)
+        self.alpha = np.load(os.path.join(out_dir, "alpha.npy"), mmap_mode=mmap_mode)
+        self.omega = np.load(os.path.join(out_dir, "omega.npy"), mmap_mode=mmap_mode)
+
+    def __len__(self):
+        return self.theta.shape[0]
+
+    def rows(self, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None):
+        """Index rows matching the selections (same conventions as TrajectoryStore.find)."""
+        index = self.index
+        mask = (
+            select(index["alpha"], alpha)
+            & select(index["omega"], omega)
+            & select(index["theta0"], theta0)
+            & select(index["thetadot0"], thetadot0)
+            & select(index["gamma"], gamma)
+            )
+        return index[mask]
+
+    def points(self, alpha, omega, theta0=None, thetadot0=None, gamma=None):
+        """(theta, thetadot) views of the first trajectory matching (alpha, omega, ...)."""
+        rows = self.rows(alpha, omega, theta0, thetadot0, gamma)
+        if len(rows) == 0:
+            raise KeyError(f"No exported trajectory for alpha={alpha}, omega={omega}")
+        start, stop = rows[0]["start"], rows[0]["stop"]
+        return self.theta[start:stop], self.thetadot[start:stop]
+
+    def slab(self, alpha):
+        """(omega, theta) views of all the points of one alpha, if stored contiguously (the export order)."""
+        rows = self.rows(alpha=alpha)
+        if len(rows) == 0:
+            raise KeyError(f"No exported trajectory for alpha={alpha}")
+        start, stop = rows["start"].min(), rows["stop"].max()
+        return self.omega[start:stop], self.theta[start:stop]
+
+
+def load_poincare(out_dir, mmap_mode="r"):
+    """Opens an export made by export_poincare without reading the point arrays."""
+    return PoincareCloud(out_dir, mmap_mode)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export stroboscopic points to memory mappable .npy files.")
+    parser.add_argument("file")
+    parser.add_argument("out_dir")
+    parser.add_argument("--gamma", type=float, default=None)
+    parser.add_argument("--theta0", type=float, default=None, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=None)
+    parser.add_argument("--float32", action="store_true", help="Store the points in single precision")
+    args = parser.parse_args()
+
+    index = export_poincare(
+            args.file, args.out_dir,
+            theta0=args.theta0, thetadot0=args.thetadot0, gamma=args.gamma,
+            dtype=np.float32 if args.float32 else np.float64,
+            )
+    print(f"Exported {index['stop'][-1]} points of {len(index)} trajectories to {args.out_dir}")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Compacts a trajectory file by streaming every group and dataset into a fresh
+file. HDF5 never reclaims the space of deleted datasets (see
+`storage_setup.create_or_overwrite_dataset`), so files grow with every
+re-scan until they are repacked.
+
+Datasets are copied block by block, never loading a whole trajectory. With
+`--profile` every dataset is re-chunked and re-compressed with that storage
+profile (see storage_setup.STORAGE_PROFILES), otherwise the filters and chunk
+shape of the source are kept.
+
+    python repack.py Data/dissip_trajectories.h5                     # in place
+    python repack.py Data/dissip_trajectories.h5 -o Data/compact.h5 --profile lzf
+"""
+import argparse
+import os
+import numpy as np
+import h5py
+import storage_setup
+
+
+def copy_attrs(src, dst):
+    for k,v in src.attrs.items():
+        dst.attrs[k] = v
+
+
+def copy_dataset(src, dst_parent, profile=None, block_length=2**16):
+    """
+    Copies dataset src into dst_parent block by block.
+    profile: storage profile of the copy. If None, the filters of src are kept.
+    """
+    name = src.name.split("/")[-1]
+    settings = storage_setup.STORAGE_PROFILES[profile] if profile else None
+    lossy = (
+        settings is not None and "dtype" in settings
+        and name not in settings.get("keep_exact", ()) and src.dtype.kind == "f"
+        )
+    dtype = settings["dtype"] if lossy else src.dtype
+
+    if src.shape == ():
+        dst = dst_parent.create_dataset(name, data=src[()], dtype=dtype)
+        copy_attrs(src, dst)
+        return dst
+
+    if settings is None:
+        chunks = src.chunks
+        filters = {"compression": src.compression, "compression_opts": src.compression_opts, "shuffle": src.shuffle}
+    else:
+        filters = {"compression": settings["compression"], "compression_opts": settings["compression_opts"], "shuffle": settings["shuffle"]}
+        samples_per_period = int(src.attrs.get("samples_per_period", src.parent.attrs.get("samples_per_period", 64)))
+        if settings["chunk_periods"] is None or src.ndim != 1:
+            chunks = True
+        elif src.maxshape[0] != src.shape[0]:  # resizable (e.g. written in SWMR mode)
+            chunks = (settings["chunk_periods"] * samples_per_period,)
+        elif src.shape[0] > 0:
+            chunks = (storage_setup.chunk_length(src.shape[0], samples_per_period, settings["chunk_periods"]),)
+        else:  # an empty fixed size dataset cannot have a chunk of a whole period
+            chunks = True
+
+    dst = dst_parent.create_dataset(
+            name, shape=src.shape, maxshape=src.maxshape, dtype=dtype, chunks=chunks, **filters,
+            )
+    copy_attrs(src, dst)
+
+    # Blocks are a whole number of destination chunks where possible
+    if dst.chunks is not None:
+        block_length = max(dst.chunks[0], block_length - block_length % dst.chunks[0])
+    lossy_error = 0.0
+    for start in range(0, src.shape[0], block_length):
+        block = src[start:start + block_length]
+        if lossy:
+            stored = block.astype(dtype)
+            lossy_error = max(lossy_error, float(np.max(np.abs(stored - block))))
+            block = stored
+        dst[start:start + block_length] = block
+
+    if profile:
+        dst.attrs["storage_profile"] = profile
+    if lossy:
+        # The rounding errors of repeated lossy passes add up
+        dst.attrs["lossy_max_abs_error"] = lossy_error + src.attrs.get("lossy_max_abs_error", 0.0)
+    return dst
+
+
+def copy_group(src, dst, profile=None):
+    """Recursively copies the members of group src into group dst."""
+    copy_attrs(src, dst)
+    if profile and "storage_profile" in src.attrs:
+        dst.attrs["storage_profile"] = profile
+    for name, obj in src.items():
+        if isinstance(obj, h5py.Group):
+            copy_group(obj, dst.create_group(name), profile)
+        elif isinstance(obj, h5py.Dataset):
+            copy_dataset(obj, dst, profile)
+
+
+def repack(path, out_path=None, profile=None):
+    """
+    Streams the file at path into out_path (path itself if None) and returns
+    the (old, new) file sizes in bytes.
+    """
+    if profile is not None and profile not in storage_setup.STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}. Choose one of {list(storage_setup.STORAGE_PROFILES)}")
+
+    in_place = out_path is None
+    tmp_path = path + ".repack" if in_place else out_path
+    old_size = os.path.getsize(path)
+
+    with h5py.File(path, "r") as src, h5py.File(tmp_path, "w", libver="latest") as dst:
+        copy_group(src, dst, profile)
+        if profile:
+            dst.attrs["storage_profile"] = profile
+
+    new_size = os.path.getsize(tmp_path)
+    if in_place:
+        os.replace(tmp_path, path)
+    return old_size, new_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact (and optionally re-compress) a trajectory file.")
+    parser.add_argument("file")
+    parser.add_argument("-o", "--output", default=None, help="Output file. Default: repack in place")
+    parser.add_argument("--profile", default=None, choices=list(storage_setup.STORAGE_PROFILES),
+                        help="Re-chunk and re-compress with this storage profile")
+    args = parser.parse_args()
+
+    old_size, new_size = repack(args.file, args.output, args.profile)
+    print(f"{args.file}: {old_size/2**20:.2f} MiB -> {new_size/2**20:.2f} MiB"
+          f" (reclaimed {(old_size - new_size)/2**20:.2f} MiB, {100*(1 - new_size/old_size):.1f}%)")
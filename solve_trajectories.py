@@ -18,7 +18,8 @@ if __name__ == "__main__":
 
     theta0 = np.deg2rad(30.0)
     thetadot0=0
-    gamma = 0.5
+    gammas = [0.5]  # Several damping values are scanned in one pass into the same file
+    storage_profile = "gzip4"  # See storage_setup.STORAGE_PROFILES
 
 
-    param_scan(theta0, thetadot0, alphas_omegas, gamma=gamma)
+    param_scan(theta0, thetadot0, alphas_omegas, gamma=gammas, storage_profile=storage_profile)
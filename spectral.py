@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Batched spectral analysis of the trajectories of a file.
+
+Equally long trajectories are stacked into a 2D array and their spectra are
+computed in one call, either as a Welch average of Hann windowed segments of
+`segment_periods` drive periods (default) or as a single Hann windowed rfft of
+the whole series. Frequencies are in units of the drive frequency omega, so
+the n-th harmonic of the drive is at n.
+
+The amplitude spectra, on the common grid k/segment_periods up to
+`max_harmonic`, are written to the `spectra` table of the file (grid in the
+`harmonics` attribute of the table). A spectral bifurcation diagram (omega
+vs. harmonic, for one alpha) is then a table lookup:
+
+    python spectral.py Data/dissip_trajectories.h5 --gamma 0.5     # compute and store
+    python spectral.py Data/dissip_trajectories.h5 --plot 59       # heatmap for alpha = 59 deg
+"""
+import argparse
+import os
+from collections import defaultdict
+import numpy as np
+import h5py
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+from scipy.signal import welch
+from tqdm import tqdm
+import storage_setup
+from trajectory_store import TrajectoryStore, TrajectoryView, select, wrap_theta
+
+plots_dir = "Plots/spectra/"
+
+
+def harmonic_grid(segment_periods=16, max_harmonic=10):
+    """Frequencies (in units of omega) at which the spectra are stored."""
+    return np.arange(max_harmonic*segment_periods + 1) / segment_periods
+
+
+def amplitude_spectra(x, samples_per_period, method="welch", segment_periods=16, max_harmonic=10):
+    """
+    Amplitude spectra of every row of x (n_series, N), in one call.
+    method: "welch" (averaged Hann windowed segments) or "rfft" (one Hann windowed rfft per row)
+    Returns the amplitudes on harmonic_grid(segment_periods, max_harmonic), shape (n_series, n_bins).
+    """
+    x = np.atleast_2d(x)
+    x = x - x.mean(axis=1, keepdims=True)
+    grid = harmonic_grid(segment_periods, max_harmonic)
+
+    if method == "welch":
+        nperseg = min(segment_periods*samples_per_period, x.shape[1])
+        freqs, power = welch(x, fs=samples_per_period, window="hann", nperseg=nperseg, axis=-1, scaling="spectrum")
+        amps = np.sqrt(2*power)
+    elif method == "rfft":
+        window = np.hanning(x.shape[1])
+        amps = 2*np.abs(np.fft.rfft(x*window, axis=-1))/np.sum(window)
+        freqs = np.fft.rfftfreq(x.shape[1], d=1/samples_per_period)
+    else:
+        raise ValueError(f"Unknown method {method!r}. Use 'welch' or 'rfft'")
+
+    # Nearest frequency bin of every grid point
+    idx = np.clip(np.round(grid/freqs[1]).astype(int), 0, freqs.size - 1)
+    return amps[:, idx]
+
+
+def compute_spectra(path, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None,
+                    method="welch", segment_periods=16, max_harmonic=10, batch_size=256):
+    """
+    Spectra of wrapped theta for the selected trajectories (see TrajectoryStore.find),
+    batched by length, merged into the `spectra` table of the file (replacing it if it
+    was computed with another method or grid). Returns the new rows.
+    """
+    grid = harmonic_grid(segment_periods, max_harmonic)
+    spectra_dtype = np.dtype([
+        ("path", object),
+        ("alpha", float),  # degrees
+        ("omega", float),
+        ("theta0", float),  # degrees
+        ("thetadot0", float),
+        ("gamma", float),
+        ("amplitude", float, (grid.size,)),
+        ])
+
+    with TrajectoryStore(path, cache_bytes=0) as store:
+        rows = store.find(alpha, omega, theta0, thetadot0, gamma)
+        table = np.zeros(len(rows), dtype=spectra_dtype)
+        for name in ("path", "alpha", "omega", "theta0", "thetadot0", "gamma"):
+            table[name] = rows[name]
+
+        # Group by (length, samples per period), so that every batch stacks into a 2D array
+        batches = defaultdict(list)
+        for i, path_i in enumerate(rows["path"]):
+            view = TrajectoryView(store, path_i)
+            batches[(view.group["theta"].shape[0], view.samples_per_period)].append(i)
+
+        with tqdm(total=len(rows), desc="Computing spectra") as progress:
+            for (length, samples), indices in batches.items():
+                for start in range(0, len(indices), batch_size):
+                    batch = indices[start:start + batch_size]
+                    x = np.empty((len(batch), length))
+                    for j, i in enumerate(batch):
+                        x[j] = wrap_theta(TrajectoryView(store, rows["path"][i]).group["theta"][:])
+                    table["amplitude"][batch] = amplitude_spectra(x, samples, method, segment_periods, max_harmonic)
+                    progress.update(len(batch))
+
+    with h5py.File(path, "a") as file:
+        old = storage_setup.read_table(file, "spectra")
+        stored = file["tables/spectra"].attrs if old is not None else None
+        if old is not None and stored["method"] == method and np.array_equal(stored["harmonics"], grid):
+            old = old[~np.isin(old["path"], table["path"])]
+            merged = np.concatenate((old, table))
+        else:
+            merged = table
+        merged = merged[np.lexsort((merged["omega"], merged["alpha"]))]
+        storage_setup.write_table(file, "spectra", merged, attrs={"harmonics": grid, "method": method})
+    return table
+
+
+def load_spectra(path):
+    """(table, harmonic grid) of the `spectra` table of the file at path, (None, None) if not computed."""
+    with h5py.File(path, "r") as file:
+        table = storage_setup.read_table(file, "spectra")
+        if table is None:
+            return None, None
+        return table, file["tables/spectra"].attrs["harmonics"]
+
+
+def plot_spectral_bifurcation(table, harmonics, alpha, gamma=0.5, theta0=30.0, thetadot0=0.0, file_name=None):
+    """Omega vs. harmonic heatmap of the stored spectra of one alpha (degrees)."""
+    rows = table[
+            select(table["alpha"], alpha) & select(table["gamma"], gamma)
+            & select(table["theta0"], theta0) & select(table["thetadot0"], thetadot0)
+            ]
+    if len(rows) == 0:
+        raise KeyError(f"No stored spectra for alpha={alpha}, gamma={gamma}")
+
+    amplitude = rows["amplitude"]
+    plt.figure(figsize=(10, 7))
+    plt.pcolormesh(rows["omega"], harmonics, amplitude.T, shading="nearest",
+                   norm=LogNorm(vmin=max(amplitude.max()*1e-5, 1e-12), vmax=amplitude.max()), cmap="magma")
+    plt.colorbar(label="FFT amplitude")
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel(r"Frequency $/\,\omega$")
+    plt.title("Spectral bifurcation diagram"
+              "\n" rf"$\alpha={alpha:05.2f}^\circ\quad \gamma={gamma}$"
+              "\n" rf"$\theta_0={theta0:.2f}^\circ,\, \dot\theta_0={thetadot0}$"
+              )
+    if file_name:
+        plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched spectra of a trajectory file.")
+    parser.add_argument("file")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=0.0)
+    parser.add_argument("--method", choices=["welch", "rfft"], default="welch")
+    parser.add_argument("--plot", type=float, nargs="*", default=None, metavar="ALPHA",
+                        help="Only plot the stored spectra of these alphas (degrees)")
+    args = parser.parse_args()
+
+    if args.plot is None:
+        table = compute_spectra(args.file, theta0=args.theta0, thetadot0=args.thetadot0, gamma=args.gamma, method=args.method)
+        print(f"Spectra of {len(table)} trajectories written to {args.file}/tables/spectra")
+    else:
+        matplotlib.use("Agg")
+        os.makedirs(plots_dir, exist_ok=True)
+        table, harmonics = load_spectra(args.file)
+        for alpha in args.plot:
+            plot_spectral_bifurcation(table, harmonics, alpha, args.gamma, args.theta0, args.thetadot0,
+                                      file_name=f"{plots_dir}{alpha:05.2f}.jpg")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Ensembles of the hoop with a noisy drive: an additive white noise torque on
+theta'' (motor jitter, air currents) and/or phase diffusion of the drive
+(wobbling hoop frequency),
+
+    d theta'  = [-B theta' - (A cos(alpha) - cos(theta)) sin(theta) + A sin(alpha) sin(phi) cos(theta)] dtau
+                + torque_noise dW_1
+    d phi     = dtau + phase_noise dW_2
+
+Thousands of realizations are integrated together by `evolve_ensemble`
+(time_evolution.py). Only ensemble statistics are kept:
+- the density of the stroboscopic points (tau = 2 pi n) after the transient, as a DensityHistogram
+- the escape time of every realization, the first tau at which theta has moved
+  more than `escape_angle` away from theta0 (pi: over the top of the hoop), NaN if never
+
+A lap-to-lap spread of the measured hoop frequency (`error_omega` of
+hoop_tracking) corresponds to phase_noise = sqrt(2 pi)*error_omega/mean_omega
+(see `phase_noise_from_omega_spread`).
+
+    python stochastic.py --alpha 60 --omega 5.8 --torque-noise 0.05 --phase-noise 0.01
+"""
+import argparse
+import os
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from time_evolution import evolve_ensemble
+from density_plot import DensityHistogram
+from trajectory_store import wrap_theta
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/stochastic/"
+
+
+def phase_noise_from_omega_spread(mean_omega, error_omega):
+    """
+    Phase diffusion whose spread of the drive phase after one period matches a relative
+    lap-to-lap frequency spread error_omega/mean_omega.
+    """
+    return np.sqrt(2*np.pi)*error_omega/mean_omega
+
+
+def ensemble_statistics(alpha, omega, gamma=0.5, theta0=np.deg2rad(30), thetadot0=0.0, n_realizations=4096,
+                        data_periods=400, discard_periods=100, torque_noise=0.0, phase_noise=0.0,
+                        escape_angle=np.pi, thetadot_range=(-5, 5), bins=(720, 500),
+                        steps_per_period=256, samples_per_period=64, method="heun", seed=0):
+    """
+    Integrates n_realizations noisy realizations (alpha in radians) and returns a dictionary with
+    "density": DensityHistogram of the stroboscopic (theta wrapped, thetadot) after discard_periods
+    "escape_tau": (n_realizations,) escape times, NaN for the realizations that never escaped
+    "strob_mean", "strob_std": ensemble mean and standard deviation of the stroboscopic thetadot per period
+    """
+    A = g/(R*omega**2)
+    B = gamma/omega
+    theta_start = np.broadcast_to(np.asarray(theta0, dtype=float), (n_realizations,)).copy()
+
+    density = DensityHistogram(x_range=(-np.pi, np.pi), y_range=thetadot_range, bins=bins)
+    escape_tau = np.full(n_realizations, np.nan)
+    strob_mean = list()
+    strob_std = list()
+
+    def observe(tau, theta, thetadot):
+        escaped = np.isnan(escape_tau) & (np.abs(theta - theta_start) > escape_angle)
+        escape_tau[escaped] = tau
+        n = int(round(tau/(2*np.pi)*samples_per_period))
+        if n % samples_per_period == 0:
+            strob_mean.append(thetadot.mean())
+            strob_std.append(thetadot.std())
+            if n >= discard_periods*samples_per_period:
+                density.add(wrap_theta(theta), thetadot)
+
+    evolve_ensemble(
+            theta_start, thetadot0, (discard_periods + data_periods)*2*np.pi, alpha, A, B,
+            steps_per_period=steps_per_period, samples_per_period=samples_per_period,
+            torque_noise=torque_noise, phase_noise=phase_noise, method=method, seed=seed, callback=observe,
+            )
+    return {
+        "density": density,
+        "escape_tau": escape_tau,
+        "strob_mean": np.array(strob_mean),
+        "strob_std": np.array(strob_std),
+        }
+
+
+def plot_ensemble_statistics(stats, title="", file_name=None):
+    fig, (ax_density, ax_escape) = plt.subplots(1, 2, figsize=(14, 6))
+    stats["density"].plot(ax=ax_density, log=True, cmap="Greys")
+    ax_density.set_xlabel(r"$\theta\;(rad)$")
+    ax_density.set_ylabel(r"$\dot\theta$")
+    ax_density.set_title("Ensemble Poincaré density")
+
+    escape_tau = stats["escape_tau"]
+    escaped = escape_tau[~np.isnan(escape_tau)]
+    if len(escaped):
+        ax_escape.hist(escaped/(2*np.pi), bins=50, color="black")
+    ax_escape.set_xlabel("Escape time (drive periods)")
+    ax_escape.set_ylabel("Realizations")
+    ax_escape.set_title(f"Escaped: {len(escaped)} of {len(escape_tau)}")
+    fig.suptitle(title)
+    if file_name:
+        fig.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ensemble statistics of the hoop with a noisy drive.")
+    parser.add_argument("--alpha", type=float, required=True, help="degrees")
+    parser.add_argument("--omega", type=float, required=True)
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees")
+    parser.add_argument("--thetadot0", type=float, default=0.0)
+    parser.add_argument("--realizations", type=int, default=4096)
+    parser.add_argument("--periods", type=int, default=400, help="Drive periods after the transient")
+    parser.add_argument("--discard", type=int, default=100, help="Transient drive periods")
+    parser.add_argument("--torque-noise", type=float, default=0.0)
+    parser.add_argument("--phase-noise", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    stats = ensemble_statistics(
+            np.deg2rad(args.alpha), args.omega, args.gamma, np.deg2rad(args.theta0), args.thetadot0,
+            n_realizations=args.realizations, data_periods=args.periods, discard_periods=args.discard,
+            torque_noise=args.torque_noise, phase_noise=args.phase_noise, seed=args.seed,
+            )
+    os.makedirs(plots_dir, exist_ok=True)
+    plot_ensemble_statistics(
+            stats,
+            title=rf"$\alpha={args.alpha:05.2f}^\circ\quad \omega={args.omega:06.3f}\quad \gamma={args.gamma}$"
+                  rf"$\quad \sigma_T={args.torque_noise}\quad \sigma_\phi={args.phase_noise}$",
+            file_name=f"{plots_dir}{args.alpha:05.2f}_{args.omega:06.3f}_{args.torque_noise}_{args.phase_noise}.jpg",
+            )
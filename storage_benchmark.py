@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compares the storage profiles of storage_setup.STORAGE_PROFILES on existing
+trajectory files. Every trajectory dataset of the input files is rewritten
+into a temporary file with each profile, and the stored bytes, the full read
+throughput and the stroboscopic (`dataset[::samples_per_period]`) read time
+are reported.
+
+    python storage_benchmark.py                      # all of Data/*.h5
+    python storage_benchmark.py Data/dissip_trajectories.h5 --limit 50
+"""
+import argparse
+import glob
+import os
+import tempfile
+from time import perf_counter
+import numpy as np
+import h5py
+import storage_setup
+
+
+def collect_datasets(path, limit=None):
+    """
+    Returns a list of (group path, samples_per_period, {name: array}) for the
+    trajectory groups of the file at `path`.
+    """
+    groups = dict()
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim == 1:
+            groups.setdefault(obj.parent.name, obj.parent)
+
+    with h5py.File(path, "r") as file:
+        file.visititems(visit)
+        trajectories = list()
+        for grp_name, grp in groups.items():
+            if limit is not None and len(trajectories) >= limit:
+                break
+            samples = int(grp.attrs.get("samples_per_period", 64))
+            data = {name: ds[:] for name, ds in grp.items() if isinstance(ds, h5py.Dataset)}
+            trajectories.append((grp_name, samples, data))
+    return trajectories
+
+
+def benchmark_profile(trajectories, profile, tmp_dir):
+    """
+    Writes all trajectories with `profile` and times reading them back.
+    Returns a dictionary of the measurements.
+    """
+    path = os.path.join(tmp_dir, f"{profile}.h5")
+    with h5py.File(path, "w") as file:
+        file.attrs["storage_profile"] = profile
+        for i, (_, samples, data) in enumerate(trajectories):
+            grp = storage_setup.get_or_create_group(file, f"trajectory{i}", attrs={"samples_per_period": samples})
+            for name, values in data.items():
+                storage_setup.create_or_overwrite_dataset(grp, name, values)
+    file_bytes = os.path.getsize(path)
+
+    raw_bytes = 0
+    max_error = 0.0
+    t0 = perf_counter()
+    with h5py.File(path, "r") as file:
+        for grp in file.values():
+            for ds in grp.values():
+                raw_bytes += ds[:].astype(np.float64).nbytes
+                max_error = max(max_error, ds.attrs.get("lossy_max_abs_error", 0.0))
+    t_full = perf_counter() - t0
+
+    t0 = perf_counter()
+    with h5py.File(path, "r") as file:
+        for grp in file.values():
+            samples = grp.attrs["samples_per_period"]
+            for ds in grp.values():
+                ds[::samples]
+    t_strob = perf_counter() - t0
+
+    os.remove(path)
+    return {
+            "bytes": file_bytes,
+            "ratio": raw_bytes/file_bytes if file_bytes else np.nan,
+            "read_MBps": raw_bytes/t_full/1e6 if t_full else np.nan,
+            "strob_read_s": t_strob,
+            "max_abs_error": max_error,
+            }
+
+
+def report(path, results):
+    print(f"\n{path}")
+    print(f"{'profile':>10} {'bytes':>12} {'ratio':>7} {'read MB/s':>10} {'strob read s':>13} {'max abs err':>12}")
+    for profile, r in results.items():
+        print(f"{profile:>10} {r['bytes']:>12d} {r['ratio']:>7.2f} {r['read_MBps']:>10.1f}"
+              f" {r['strob_read_s']:>13.4f} {r['max_abs_error']:>12.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes and read throughput per storage profile.")
+    parser.add_argument("files", nargs="*", default=sorted(glob.glob("Data/*.h5")))
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of trajectories per file")
+    parser.add_argument("--profiles", nargs="*", default=list(storage_setup.STORAGE_PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in args.files:
+            trajectories = collect_datasets(path, args.limit)
+            if not trajectories:
+                print(f"\n{path}: no trajectory datasets. Skipping...")
+                continue
+            results = {profile: benchmark_profile(trajectories, profile, tmp_dir) for profile in args.profiles}
+            report(path, results)
@@ -61,6 +61,13 @@ Hierarchy semantics:
 
 Physical parameter values are stored as ATTRIBUTES, not encoded in group names.
 
+Results of analyses over the whole file (e.g. the per-trajectory features of
+`features.py`) are stored as tables, i.e. structured datasets with one row per
+trajectory, in the `tables` group. Use write_table and read_table for them.
+`param_scan` writes the `catalog` table (path, alpha, omega, theta0,
+thetadot0, gamma, rotation_number of every trajectory) once a scan is
+complete, and removes it while a scan is running.
+
 
 Metadata
 --------
@@ -72,10 +79,38 @@ At the file level:
 - dt           : integration time step
 - *_units      : physical units of parameters
 
+- storage_profile : name of the entry of STORAGE_PROFILES used to write
+                  the datasets (see "Storage Profiles" below)
+
 At the group level:
 - alpha        : value of alpha
 - omega        : value of omega
 - theta0, thetadot0   : initial conditions (for strob and uniform groups)
+- rotation_number, crossings_forward, crossings_backward, turning_points :
+                 loops over the top and theta-dot sign changes counted during the
+                 integration (time_evolution.rotation_counts), after the transient
+- energy_drift, energy_drift_rate, energy_suspect, energy_tol :
+                 residual of the energy balance along the trajectory
+                 (time_evolution.energy_drift), energy_suspect = energy_drift > energy_tol
+
+
+Storage Profiles
+----------------
+Datasets are written according to a named storage profile, one of the keys of
+STORAGE_PROFILES. A profile fixes the compression filter (gzip level or lzf),
+whether the byte shuffle filter is applied, and the chunk length, which is
+always a whole number of drive periods (`chunk_periods*samples_per_period`)
+so that stroboscopic slices `dataset[::samples_per_period]` touch every chunk
+in the same place.
+
+The "float32" profile is lossy: trajectories are stored in single precision
+and every such dataset carries a `lossy_max_abs_error` attribute with the
+largest absolute rounding error introduced. Datasets listed in `keep_exact`
+(`tau`) are always kept in double precision.
+
+The profile is stored in the `storage_profile` file attribute and inherited by
+every group, so later writes to the same file use the same profile. Use
+`storage_benchmark.py` to compare profiles on existing files.
 
 
 Basic Usage
@@ -118,6 +153,22 @@ To loop over all stored data without exhausting memory:
     ...                 # analysis here
 
 
+Reading While a Scan Is Running (SWMR)
+--------------------------------------
+`param_scan` creates every group and an empty, resizable dataset for each
+trajectory up front, then switches the file to HDF5 single-writer/multiple-
+reader mode. Each finished trajectory is written with `fill_dataset` and
+flushed; `theta` is always written last, so a trajectory is complete once its
+`theta` dataset is non-empty. Open a live file with
+
+    >>> with h5py.File("dissip_trajectories.h5", "r", libver="latest", swmr=True) as f:
+    ...     ds = f["alpha22.00/omega01.500/uniform30.0_00.0_0.5/theta"]
+    ...     ds.refresh()   # pick up data written since the file was opened
+
+or simply use `TrajectoryStore(path, swmr=True)`, which skips trajectories
+that have not been written yet.
+
+
 Important Notes
 ---------------
 - Do NOT load entire files into memory at once.
@@ -130,6 +181,18 @@ import os.path
 import numpy as np
 import h5py
 
+def alpha_key(alpha_deg):
+    """Name of the group of alpha (in degrees)."""
+    return f"alpha{alpha_deg:05.2f}"
+
+def omega_key(omega):
+    """Name of the group of omega."""
+    return f"omega{omega:06.3f}"
+
+def trajectory_key(theta0_deg, thetadot0, gamma):
+    """Name of the group of a uniformly sampled trajectory. theta0 in degrees."""
+    return f"uniform{theta0_deg:04.1f}_{thetadot0:04.1f}_{gamma}"
+
 def get_or_create_group(parent, name, attrs=None):
     """
     Gets or creates a group.
@@ -152,21 +215,86 @@ def get_or_create_group(parent, name, attrs=None):
                 group.attrs[k] = v
     return group
 
-def create_or_overwrite_dataset(parent, name, data, attrs=None):
+STORAGE_PROFILES = {
+    # Original behaviour: gzip with h5py's guessed chunk shape
+    "legacy": {"compression": "gzip", "compression_opts": None, "shuffle": False, "chunk_periods": None},
+    "none": {"compression": None, "compression_opts": None, "shuffle": False, "chunk_periods": 64},
+    "gzip1": {"compression": "gzip", "compression_opts": 1, "shuffle": True, "chunk_periods": 64},
+    "gzip4": {"compression": "gzip", "compression_opts": 4, "shuffle": True, "chunk_periods": 64},
+    "gzip9": {"compression": "gzip", "compression_opts": 9, "shuffle": True, "chunk_periods": 64},
+    "lzf": {"compression": "lzf", "compression_opts": None, "shuffle": True, "chunk_periods": 64},
+    # Lossy: single precision, error bound recorded in `lossy_max_abs_error`
+    "float32": {"compression": "gzip", "compression_opts": 4, "shuffle": True, "chunk_periods": 64,
+                "dtype": "float32", "keep_exact": ("tau",)},
+}
+DEFAULT_PROFILE = "gzip4"
+
+
+def get_storage_profile(parent, profile=None):
+    """
+    Returns (name, settings) of the storage profile to use under `parent`.
+    profile: name of the profile. If None, the `storage_profile` attribute of
+             parent (inherited from the file) is used, else DEFAULT_PROFILE.
+    """
+    if profile is None:
+        profile = parent.attrs.get("storage_profile", parent.file.attrs.get("storage_profile", DEFAULT_PROFILE))
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}. Choose one of {list(STORAGE_PROFILES)}")
+    return profile, STORAGE_PROFILES[profile]
+
+
+def chunk_length(n_samples, samples_per_period, chunk_periods):
+    """
+    Chunk length that is a whole number of drive periods, but not longer than
+    the data itself (HDF5 does not allow chunks larger than a fixed size dataset).
+    """
+    periods = min(chunk_periods, n_samples // samples_per_period)
+    if periods == 0:
+        return n_samples
+    return periods * samples_per_period
+
+
+def create_or_overwrite_dataset(parent, name, data, attrs=None, profile=None):
     """
     Creates a dataset and overwrites it if it exists.
     parent: h5 group
     name: name of the dataset (string)
     data: numpy array to put in the dataset
     attrs: dictionary of attributes to be added to the dataset
+    profile: name of the storage profile (see STORAGE_PROFILES). Defaults to
+             the profile stored in the file attributes.
     """
     if name in parent:
         del parent[name]
 
-    ds = parent.create_dataset(name, data=data, compression="gzip", chunks=True)
+    profile, settings = get_storage_profile(parent, profile)
+    data = np.asarray(data)
+
+    lossy_error = None
+    if "dtype" in settings and name not in settings.get("keep_exact", ()) and data.dtype.kind == "f":
+        stored = data.astype(settings["dtype"])
+        lossy_error = float(np.max(np.abs(stored - data))) if data.size else 0.0
+        data = stored
+
+    if settings["chunk_periods"] is None or data.ndim != 1 or data.size == 0:
+        chunks = True
+    else:
+        samples_per_period = int(parent.attrs.get("samples_per_period", 64))
+        chunks = (chunk_length(data.size, samples_per_period, settings["chunk_periods"]),)
+
+    ds = parent.create_dataset(
+            name, data=data,
+            compression=settings["compression"],
+            compression_opts=settings["compression_opts"],
+            shuffle=settings["shuffle"],
+            chunks=chunks,
+            )
 
     for k,v in parent.attrs.items():
         ds.attrs.setdefault(k,v)
+    ds.attrs["storage_profile"] = profile
+    if lossy_error is not None:
+        ds.attrs["lossy_max_abs_error"] = lossy_error
     if attrs:
         for k,v in attrs.items():
             ds.attrs[k] = v
@@ -174,22 +302,125 @@ def create_or_overwrite_dataset(parent, name, data, attrs=None):
     return ds
 
 
-def setup_file(path, integrator, data_type, alphas, omegas, dtau=0):
+def create_empty_dataset(parent, name, max_length=None, attrs=None, profile=None):
+    """
+    Creates (overwriting) an empty, resizable 1D dataset that is filled later
+    with fill_dataset. Needed for SWMR writing, where no new objects can be
+    created once the file is in SWMR mode.
+    parent: h5 group
+    name: name of the dataset (string)
+    max_length: expected length of the data, used to choose the chunk length
+    attrs: dictionary of attributes to be added to the dataset
+    profile: name of the storage profile (see STORAGE_PROFILES)
+    """
+    if name in parent:
+        del parent[name]
+
+    profile, settings = get_storage_profile(parent, profile)
+    lossy = "dtype" in settings and name not in settings.get("keep_exact", ())
+    dtype = settings["dtype"] if lossy else np.float64
+
+    samples_per_period = int(parent.attrs.get("samples_per_period", 64))
+    if settings["chunk_periods"] is None:
+        chunks = True
+    elif max_length:
+        chunks = (chunk_length(max_length, samples_per_period, settings["chunk_periods"]),)
+    else:
+        chunks = (settings["chunk_periods"] * samples_per_period,)
+
+    ds = parent.create_dataset(
+            name, shape=(0,), maxshape=(None,), dtype=dtype,
+            compression=settings["compression"],
+            compression_opts=settings["compression_opts"],
+            shuffle=settings["shuffle"],
+            chunks=chunks,
+            )
+
+    for k,v in parent.attrs.items():
+        ds.attrs.setdefault(k,v)
+    ds.attrs["storage_profile"] = profile
+    if lossy:
+        ds.attrs["lossy_max_abs_error"] = np.nan  # Attributes can only be modified, not created, in SWMR mode
+    if attrs:
+        for k,v in attrs.items():
+            ds.attrs[k] = v
+
+    return ds
+
+
+def fill_dataset(ds, data):
+    """
+    Writes data into a dataset made by create_empty_dataset and flushes it, so
+    SWMR readers see the complete data once the new shape is visible.
+    """
+    data = np.asarray(data)
+    if "lossy_max_abs_error" in ds.attrs:
+        stored = data.astype(ds.dtype)
+        ds.attrs.modify("lossy_max_abs_error", float(np.max(np.abs(stored - data))) if data.size else 0.0)
+        data = stored
+    ds.resize(data.shape)
+    ds[:] = data
+    ds.flush()
+    return ds
+
+
+def write_table(file, name, table, attrs=None):
+    """
+    Writes a structured numpy array as the table /tables/<name>, overwriting it if it exists.
+    A "path" field of python strings is stored as variable length strings.
+    file: h5 file
+    table: structured numpy array, one row per trajectory
+    attrs: dictionary of attributes to be added to the table
+    """
+    tables = get_or_create_group(file, "tables")
+    if name in tables:
+        del tables[name]
+
+    dtype = np.dtype([
+        (field, h5py.string_dtype()) if table.dtype[field] == object else (field, table.dtype[field].base, table.dtype[field].shape)
+        for field in table.dtype.names
+        ])
+    ds = tables.create_dataset(name, data=table.astype(dtype), compression="gzip", shuffle=True)
+    if attrs:
+        for k,v in attrs.items():
+            ds.attrs[k] = v
+    return ds
+
+
+def read_table(file, name):
+    """
+    Reads the table /tables/<name> as a structured numpy array (strings decoded),
+    or returns None if it does not exist.
+    """
+    if f"tables/{name}" not in file:
+        return None
+    table = file[f"tables/{name}"][:]
+    for field in table.dtype.names:
+        if table.dtype[field] == object:
+            table[field] = [v.decode() if isinstance(v, bytes) else v for v in table[field]]
+    return table
+
+
+def setup_file(path, integrator, data_type, alphas, omegas, dtau=0, storage_profile=DEFAULT_PROFILE):
     if os.path.isfile(path):
         print(f"{path} already exists. Skipping...")
         return
 
+    if storage_profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {storage_profile!r}. Choose one of {list(STORAGE_PROFILES)}")
+
     print(f"Setting up {path}")
     with h5py.File(path, "w") as file:
         file.attrs["integrator"] = integrator
         file.attrs["data_type"] = data_type
         file.attrs["dtau"] = dtau
+        file.attrs["storage_profile"] = storage_profile
         file.attrs["alpha_units"] = "radians"
         file.attrs["omega_units"] = "rad/s"
         for alpha in alphas:
-            group = get_or_create_group(file, f"alpha{np.rad2deg(alpha):05.2f}", attrs={"alpha": alpha})
+            group = get_or_create_group(file, alpha_key(np.rad2deg(alpha)), attrs={"alpha": alpha})
             for omega in omegas:
-                grp = get_or_create_group(group, f"omega{omega:06.3f}", attrs={"omega": omega})
+                grp = get_or_create_group(group, omega_key(omega), attrs={"omega": omega})
 
 if __name__ == "__main__":
     alphas_deg = [i for i in range(0,91)]
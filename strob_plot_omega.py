@@ -1,46 +1,67 @@
 #!/usr/bin/env python
-import h5py
 import numpy as np
 import matplotlib.pyplot as plt
+from trajectory_store import TrajectoryStore, wrap_theta
+from density_plot import DensityHistogram
+import batch_plot
 
+data_file_path = "Data/dissip_trajectories.h5"
 plots_dir = "Plots/strob_plots_omega/gamma_0.5/theta0_30/"
 
 alphas_deg = range(0, 90, 1)
 #alphas_deg = [50]
+omega_range = (1, 5.98)
+domega = 0.02
+theta_bins = 720
+theta0_deg = 30.0
+thetadot0 = 0.0
+gamma = 0.5
 
-with h5py.File("Data/dissip_trajectories.h5", "r") as file:
-    for alpha in alphas_deg:
-        alpha_grp = file[f"alpha{alpha:05.2f}"]
-        omega_array = list()
-        theta_array = list()
-        for omega_val in np.arange(1,6,0.02): 
-            omega_grp = alpha_grp[f"omega{omega_val:06.3f}"]
-            omega = omega_grp.attrs["omega"]
-            trjy_grp = omega_grp["uniform30.0_00.0_0.5"]
-            theta0 = trjy_grp.attrs["theta0"]
-            thetadot0 = trjy_grp.attrs["thetadot0"]
-            samples = trjy_grp.attrs["samples_per_period"]
-            theta = trjy_grp["theta"][::samples]
-            theta = (np.array(theta) + np.pi) % (2*np.pi) - np.pi  #  Plotting theta in the range -pi to pi
-
-            omega = [omega]*np.size(theta)
-            theta_array.extend(theta)
-            omega_array.extend(omega)
-
-        plt.figure()
-        plt.scatter(omega_array, theta_array, s=0.1, color="black")
-        plt.xlabel(r"$\omega\,(rad/s)$")
-        plt.ylabel("Stroboscopic sampling of " + r"$\theta(t=nT)$")
-        plt.ylim(-np.pi, np.pi)
-        plt.title("Stroboscopic "
-                  r"$\theta$" " vs. " r"$\omega$"
-                  #"\n" rf"$\alpha={alpha:05.2f}^\circ,\,gamma={init_grp.attrs['gamma']}$"
-                  "\n" rf"$\alpha={alpha:05.2f}^\circ\quad \gamma=0.5$"
-                  "\n" rf"$\theta_0={np.rad2deg(theta0):.2f}^\circ,\, \dot{theta}_0={thetadot0}$"
-                  )
-
-        file_name = f"{plots_dir}{alpha:05.2f}.jpg"
-        plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+
+def plot_alpha(store, file_name, alpha, omega_range, domega, theta0_deg, thetadot0, gamma, theta_bins):
+    # One histogram column per omega value
+    omegas = np.arange(omega_range[0], omega_range[1] + domega/2, domega)
+    density = DensityHistogram(
+            x_range=(omegas[0] - domega/2, omegas[-1] + domega/2),
+            y_range=(-np.pi, np.pi),
+            bins=(len(omegas), theta_bins),
+            )
+    # The next trajectories are decoded in the background while this one is binned
+    for trjy in store.prefetch(alpha=alpha, omega=tuple(omega_range), theta0=theta0_deg, thetadot0=thetadot0, gamma=gamma, names=("theta",), strob=True):
+        theta = wrap_theta(trjy.strob("theta"))  #  Plotting theta in the range -pi to pi
+        density.add(trjy.attrs["omega"], theta)
+
+    plt.figure()
+    density.plot(log=True, cmap="Greys")
+    plt.xlabel(r"$\omega\,(rad/s)$")
+    plt.ylabel("Stroboscopic sampling of " + r"$\theta(t=nT)$")
+    plt.ylim(-np.pi, np.pi)
+    plt.title("Stroboscopic "
+              r"$\theta$" " vs. " r"$\omega$"
+              "\n" rf"$\alpha={alpha:05.2f}^\circ\quad \gamma={gamma}$"
+              "\n" rf"$\theta_0={theta0_deg:.2f}^\circ,\, \dot\theta_0={thetadot0}$"
+              )
+
+    plt.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+    plt.close()
+
+
+if __name__ == "__main__":
+    # swmr=True: the plots can be drawn while param_scan is still writing the file
+    jobs = list()
+    with TrajectoryStore(data_file_path, swmr=True) as store:
+        for alpha in alphas_deg:
+            sources = store.find(alpha=alpha, omega=omega_range, theta0=theta0_deg, thetadot0=thetadot0, gamma=gamma)["path"]
+            if len(sources) == 0:
+                continue  # Nothing written for this alpha yet
+            jobs.append({
+                "file_name": f"{plots_dir}{alpha:05.2f}.jpg",
+                "sources": list(sources),
+                "params": {
+                    "alpha": float(alpha), "omega_range": omega_range, "domega": domega,
+                    "theta0_deg": theta0_deg, "thetadot0": thetadot0, "gamma": gamma, "theta_bins": theta_bins,
+                    },
+                })
+
+    for file_name in batch_plot.run_jobs(plot_alpha, jobs, data_file_path, manifest_path=f"{plots_dir}manifest.json"):
         print(file_name)
-        #plt.show()
-        plt.close()
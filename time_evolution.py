@@ -3,6 +3,7 @@
 
 import numpy as np
 from scipy.integrate import solve_ivp
+from scipy.interpolate import PPoly, splrep
 from math import sin, cos
 
 
@@ -89,12 +90,24 @@ def time_evolve_rk(
     samples_per_period = 64,
     rtol=1e-7,
     atol=1e-8,
+    dense_output=False,  # Also return the solver's continuous interpolant
+    count_crossings=False,  # Count loops over the top and turning points with solver events
+    monitor_energy=False,  # Check the energy balance along the solution, see energy_drift
+    energy_tol=1e-4,  # energy_drift above which a run is flagged as suspect
+    section=None,  # ("thetadot", value) or ("theta", value mod 2 pi): record the crossings of that surface
+    section_direction=0,  # +1 / -1: only increasing / decreasing crossings, 0: both
     ):
     """
     Time evolve the driven pendulum with damping.
 
     Returns:
         tau_vals, theta_vals, theta_dot_vals
+        with dense_output=True also the OdeSolution, sol(tau) -> (theta, theta_dot) at any tau
+        in (tau_in, discard_tau + data_tau)
+        with count_crossings=True also the rotation_counts dictionary of the data window
+        with monitor_energy=True also the energy_drift dictionary of the data window
+        with section also a dictionary of the "tau", "theta", "thetadot" arrays of the crossings
+        in the data window (last), located by the solver's event root finding
     """
     
     tau_fin = discard_tau + data_tau
@@ -120,23 +133,358 @@ def time_evolve_rk(
     N = int(data_tau/dtau)
     tau_uniform = discard_tau + dtau * np.arange(N)
 
-    y0 = [theta0, thetadot0]
+    events = list()
+    if count_crossings:
+        events += [over_the_top, turning_point]
+    if section is not None:
+        events.append(section_event(*section, direction=section_direction))
 
+    # The work of the energy balance is integrated afterwards from the interpolant: as an extra
+    # solver component it would enter the error norm and change the steps (and the trajectory)
     sol = solve_ivp(
         dynamical_system,
         tau_span,
-        y0,
+        [theta0, thetadot0],
         method=method,
-        dense_output=False,
+        dense_output=dense_output or monitor_energy,
         t_eval=tau_uniform,
         rtol=rtol,
         atol=atol,
+        events=events or None,
     )
 
+    result = (sol.t, sol.y[:2])
+    if dense_output:
+        result += (sol.sol,)
+    if count_crossings:
+        result += (rotation_counts(sol.t_events, sol.y_events, discard_tau, data_tau),)
+    if monitor_energy:
+        residual = energy_residual(sol.y[0], sol.y[1], work(sol.sol, sol.t, alpha, A, B), alpha, A)
+        result += (energy_drift(sol.t, residual, sol.y[1], A, energy_tol),)
+    if section is not None:
+        result += (section_crossings(sol.t_events[-1], sol.y_events[-1], section, section_direction, discard_tau),)
+    return result
+
+
+def energy(theta, theta_dot, alpha, A):
+    """
+    Energy of the bead in the rotating frame (in units of m R^2 omega^2),
+        E = theta'^2/2 - A cos(alpha) cos(theta) - sin(theta)^2/2
+    For alpha = 0 and B = 0 this is the conserved Jacobi integral. In general
+        dE/dtau = -B theta'^2 + A sin(alpha) sin(tau) cos(theta) theta'
+    """
+    return 0.5*theta_dot**2 - A*np.cos(alpha)*np.cos(theta) - 0.5*np.sin(theta)**2
+
+
+def work(sol, tau, alpha, A, B, n_nodes=8):
+    """
+    W(tau) - W(tau[0]), the integral of dE/dtau (see energy) along the continuous solution
+    sol(tau) -> (theta, theta_dot), by Gauss-Legendre quadrature on every interval of tau.
+    """
+    x, weights = np.polynomial.legendre.leggauss(n_nodes)
+    half = 0.5*np.diff(tau)
+    nodes = (tau[:-1] + half)[:, None] + half[:, None]*x
+    theta, theta_dot = sol(nodes.ravel())[:2].reshape(2, *nodes.shape)
+    power = theta_dot*(-B*theta_dot + A*np.sin(alpha)*np.sin(nodes)*np.cos(theta))
+    return np.concatenate(([0.0], np.cumsum(half*(power @ weights))))
+
+
+def energy_residual(theta, theta_dot, work, alpha, A):
+    """
+    E(tau) - E(tau_0) - W(tau) + W(tau_0), W the integral of dE/dtau. Zero for an exact solution,
+    whatever the damping and the drive. Arrays broadcast (e.g. (n_samples, n_realizations)).
+    """
+    E = energy(theta, theta_dot, alpha, A)
+    return (E - E[0]) - (work - work[0])
+
+
+def energy_drift(tau, residual, theta_dot, A, energy_tol=1e-4):
+    """
+    Drift statistics of an energy_residual, relative to the energy scale A + 1 + max(theta'^2)/2:
+    energy_drift: largest absolute residual
+    energy_drift_rate: least squares slope of the residual per drive period
+    energy_suspect: energy_drift > energy_tol, integrator error rather than physics
+    """
+    scale = A + 1 + 0.5*np.max(theta_dot**2, axis=0)
+    drift = np.max(np.abs(residual), axis=0)/scale
+    periods = (tau - tau[0])/(2*np.pi)
+    periods = periods - periods.mean()
+    slope = np.tensordot(periods, residual - residual.mean(axis=0), axes=(0, 0))/np.sum(periods**2)
+    return {
+        "energy_drift": drift,
+        "energy_drift_rate": slope/scale,
+        "energy_suspect": drift > energy_tol,
+        }
+
+
+def over_the_top(tau, config):
+    """Event: theta passes the top of the hoop, theta = pi + 2 pi k."""
+    return sin((config[0] - np.pi)/2)
+
+
+def turning_point(tau, config):
+    """Event: theta_dot changes sign."""
+    return config[1]
+
+
+def section_event(surface, value, direction=0):
+    """Event of the section surface theta_dot = value or theta = value + 2 pi k (see section_crossings)."""
+    if surface == "thetadot":
+        def event(tau, config):
+            return config[1] - value
+    elif surface == "theta":
+        # Also zero at value + pi, those roots and the direction are filtered by section_crossings
+        def event(tau, config):
+            return sin(config[0] - value)
+        return event
+    else:
+        raise ValueError(f"Unknown section surface {surface!r}. Use 'thetadot' or 'theta'")
+    event.direction = direction
+    return event
+
+
+def section_crossings(t_events, y_events, section, direction, discard_tau):
+    """The section_event crossings after discard_tau, as a dictionary of tau, theta, thetadot arrays."""
+    surface, value = section
+    tau = np.asarray(t_events)
+    y = np.array([y[:2] for y in y_events], dtype=float).reshape(-1, 2)
+    keep = tau >= discard_tau
+    if surface == "theta":
+        keep &= np.cos(y[:, 0] - value) > 0
+        if direction:
+            keep &= np.sign(y[:, 1]) == np.sign(direction)
+    return {"tau": tau[keep], "theta": y[keep, 0], "thetadot": y[keep, 1]}
+
+
+def rotation_counts(t_events, y_events, discard_tau, data_tau):
+    """
+    Counts of the over_the_top and turning_point events (in this order) after discard_tau:
+    crossings_forward / crossings_backward: passes over the top with theta_dot > 0 / < 0
+    turning_points: sign changes of theta_dot
+    rotation_number: net loops per drive period, 0 for oscillations, +-1 for a loop per period
+    """
+    top_tau, turn_tau = t_events
+    top_thetadot = np.array([y[1] for y in y_events[0]], dtype=float)
+    in_data = top_tau >= discard_tau
+    forward = int(np.count_nonzero(top_thetadot[in_data] > 0))
+    backward = int(np.count_nonzero(top_thetadot[in_data] < 0))
+    return {
+        "rotation_number": (forward - backward)/(data_tau/(2*np.pi)),
+        "crossings_forward": forward,
+        "crossings_backward": backward,
+        "turning_points": int(np.count_nonzero(turn_tau >= discard_tau)),
+        }
+
+
+
+def _stack_profile(omega_pp, phase_pp):
+    """One piecewise polynomial t -> (omega(t), phi(t)) from two on the same breakpoints."""
+    k = max(omega_pp.c.shape[0], phase_pp.c.shape[0])
+    c = np.zeros((k, omega_pp.c.shape[1], 2))
+    c[k - omega_pp.c.shape[0]:, :, 0] = omega_pp.c
+    c[k - phase_pp.c.shape[0]:, :, 1] = phase_pp.c
+    return PPoly(c, omega_pp.x, extrapolate=True)
+
+
+def _spline(t, y, smoothing):
+    t, y = np.atleast_1d(np.asarray(t, dtype=float)), np.atleast_1d(np.asarray(y, dtype=float))
+    if len(t) == 1:
+        return PPoly(y[None, :], [t[0], t[0] + 1], extrapolate=True)  # constant
+    tck = splrep(t, y, k=min(3, len(t) - 1), s=0 if smoothing is None else smoothing)
+    return PPoly.from_spline(tck, extrapolate=True)
+
+
+def drive_profile(t, omega, smoothing=None):
+    """
+    Drive profile of the hoop from measured angular velocity samples (t in sec, omega in rad/s).
+    Returns a piecewise polynomial, profile(t) -> (omega(t), phi(t)), where the drive phase
+    phi(t) = integral of omega from t[0] to t is the exact antiderivative of the spline.
+    smoothing=None interpolates the samples, otherwise a smoothing spline is fitted with the
+    sum of squared residuals <= smoothing. Outside [t[0], t[-1]] the end pieces are extrapolated,
+    so a single sample is a constant omega.
+    """
+    omega_pp = _spline(t, omega, smoothing)
+    return _stack_profile(omega_pp, omega_pp.antiderivative())
+
+
+def drive_profile_from_laps(lap_marks, smoothing=None):
+    """
+    Drive profile from the times (sec) at which the hoop passed the tracker's tripwire
+    (`lap_marks` of hoop_tracking.get_angular_velocity). The phase is 2 pi k at the k-th mark,
+    omega(t) is the derivative of the phase spline.
+    """
+    lap_marks = np.asarray(lap_marks, dtype=float)
+    phase_pp = _spline(lap_marks, 2*np.pi*np.arange(len(lap_marks)), smoothing)
+    return _stack_profile(phase_pp.derivative(), phase_pp)
+
+
+def time_evolve_variable_omega(
+    theta0,
+    thetadot0,
+    t_eval,  # sec
+    profile,  # drive_profile(...) or drive_profile_from_laps(...)
+    alpha,
+    gamma=0.5,
+    g=9.8,
+    R=0.355/2,
+    phase0=0.0,  # drive phase at t = 0 of the profile
+    t_in=None,  # start of the integration, default t_eval[0]
+    method="DOP853",
+    rtol=1e-7,
+    atol=1e-8,
+    dense_output=False,
+    ):
+    """
+    Time evolve the hoop with a drifting angular velocity omega(t), in physical time:
+
+        theta.. = -gamma theta. - (g/R cos(alpha) - omega(t)^2 cos(theta)) sin(theta) + g/R sin(alpha) sin(phi(t)) cos(theta)
+
+    with phi(t) = phase0 + integral of omega. For a constant omega this is the equation of
+    time_evolve_rk multiplied by omega^2. The phase integral is part of `profile`, so the right
+    hand side only evaluates one piecewise polynomial.
+
+    Returns:
+        t_vals, (theta_vals, theta_dot_vals), with dense_output=True also the OdeSolution
+    """
+    t_eval = np.asarray(t_eval, dtype=float)
+    t_in = t_eval[0] if t_in is None else t_in
+    g_cos_alpha = g/R*cos(alpha)
+    g_sin_alpha = g/R*sin(alpha)
+
+    def dynamical_system(t, config):
+        theta, theta_dot = config
+        omega, phase = profile(t)
+
+        dtheta_dot_dt = (
+            - gamma * theta_dot
+            - (g_cos_alpha - omega*omega*cos(theta)) * sin(theta)
+            + g_sin_alpha * sin(phase + phase0) * cos(theta)
+        )
+
+        return [theta_dot, dtheta_dot_dt]
+
+    sol = solve_ivp(
+        dynamical_system,
+        (t_in, t_eval[-1]),
+        [theta0, thetadot0],
+        method=method,
+        dense_output=dense_output,
+        t_eval=t_eval,
+        rtol=rtol,
+        atol=atol,
+    )
+
+    if dense_output:
+        return (sol.t, sol.y, sol.sol)
     return (sol.t, sol.y)
 
 
 
+def evolve_ensemble(
+    theta0,
+    thetadot0,
+    tau_fin,
+    alpha,
+    A,  # g/(R* omega**2)
+    B,  # ɣ/omega
+    steps_per_period=256,
+    samples_per_period=64,
+    torque_noise=0.0,  # strength of the additive white noise torque on theta'' (per sqrt(tau))
+    phase_noise=0.0,  # diffusion of the drive phase, dphi = dtau + phase_noise*dW
+    method="heun",  # "heun" (stochastic Heun, strong order 1 for additive noise) or "euler" (Euler-Maruyama)
+    seed=None,
+    callback=None,
+    monitor_energy=False,  # Accumulate the energy balance, see energy_drift
+    energy_tol=1e-4,
+    ):
+    """
+    Fixed step integration of a whole ensemble of realizations at once.
+    theta0, thetadot0, alpha, A, B: scalars or arrays broadcast to the ensemble shape (n,)
+    With torque_noise = phase_noise = 0 this is a plain (Heun / Euler) integration of
+    the deterministic hoop, so parameter ensembles can use it too.
+
+    callback(tau, theta, thetadot) is called samples_per_period times per drive period
+    (starting at tau = 0) with the arrays of the whole ensemble, so that statistics can be
+    accumulated without storing the paths.
+
+    With monitor_energy=True the work of the damping, the drive and the noise torque is
+    accumulated with the same scheme, and the energy_drift dictionary (one value per
+    realization, from the residual at every whole drive period) is returned as well.
+
+    Returns:
+        theta, theta_dot, phase at tau_fin (and the energy_drift dictionary)
+    """
+    if steps_per_period % samples_per_period:
+        raise ValueError("steps_per_period must be a multiple of samples_per_period")
+    if method not in ("heun", "euler"):
+        raise ValueError(f"Unknown method {method!r}. Use 'heun' or 'euler'")
+
+    theta, theta_dot, alpha, A, B = (np.array(x, dtype=float) for x in np.broadcast_arrays(theta0, thetadot0, alpha, A, B))
+    theta, theta_dot = theta.ravel().copy(), theta_dot.ravel().copy()
+    A_cos_alpha = (A*np.cos(alpha)).ravel()
+    A_sin_alpha = (A*np.sin(alpha)).ravel()
+    B = B.ravel()
+    phase = np.zeros_like(theta)
+    rng = np.random.default_rng(seed)
+
+    h = 2*np.pi/steps_per_period
+    sqrt_h = np.sqrt(h)
+    sample_every = steps_per_period//samples_per_period
+    n_steps = int(round(tau_fin/h))
+
+    def acceleration(theta, theta_dot, phase):
+        return (
+            - B * theta_dot
+            - (A_cos_alpha - np.cos(theta)) * np.sin(theta)
+            + A_sin_alpha * np.sin(phase) * np.cos(theta)
+        )
+
+    def power(theta, theta_dot, phase):
+        return theta_dot*(- B * theta_dot + A_sin_alpha * np.sin(phase) * np.cos(theta))
+
+    work = np.zeros_like(theta)
+    residuals = list()
+    theta_dots = list()
+    alpha = alpha.ravel()
+    A = A.ravel()
+    E0 = energy(theta, theta_dot, alpha, A)
+
+    for step in range(n_steps + 1):
+        if callback is not None and step % sample_every == 0:
+            callback(step*h, theta, theta_dot)
+        if monitor_energy and step % steps_per_period == 0:
+            residuals.append(energy(theta, theta_dot, alpha, A) - E0 - work)
+            theta_dots.append(theta_dot.copy())
+        if step == n_steps:
+            break
+
+        dW_torque = torque_noise*sqrt_h*rng.standard_normal(theta.shape) if torque_noise else 0
+        dW_phase = phase_noise*sqrt_h*rng.standard_normal(theta.shape) if phase_noise else 0
+
+        F = acceleration(theta, theta_dot, phase)
+        theta_pred = theta + h*theta_dot
+        theta_dot_pred = theta_dot + h*F + dW_torque
+        phase_pred = phase + h + dW_phase
+        if method == "heun":
+            theta_new = theta + h/2*(theta_dot + theta_dot_pred)
+            theta_dot_new = theta_dot + h/2*(F + acceleration(theta_pred, theta_dot_pred, phase_pred)) + dW_torque
+            if monitor_energy:
+                work += (h/2*(power(theta, theta_dot, phase) + power(theta_pred, theta_dot_pred, phase_pred))
+                         + (theta_dot + theta_dot_new)/2*dW_torque)
+            theta, theta_dot = theta_new, theta_dot_new
+        else:
+            if monitor_energy:
+                # Ito: dE = theta' dW + sigma^2/2 dtau for the additive noise torque
+                work += h*power(theta, theta_dot, phase) + theta_dot*dW_torque + 0.5*torque_noise**2*h
+            theta, theta_dot = theta_pred, theta_dot_pred
+        phase = phase_pred
+
+    if monitor_energy:
+        periods = 2*np.pi*np.arange(len(residuals))
+        return theta, theta_dot, phase, energy_drift(periods, np.array(residuals), np.array(theta_dots), A, energy_tol)
+    return theta, theta_dot, phase
+
+
 #-------------------------
 # Example usage
 #-------------------------
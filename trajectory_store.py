@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+"""
+Read access to trajectory files written by `param_scan` (layout described in
+storage_setup.py).
+
+    >>> from trajectory_store import TrajectoryStore
+    >>> with TrajectoryStore("Data/dissip_trajectories.h5") as store:
+    ...     trjy = store.get(22, 1.5, ic=(30.0, 0.0), gamma=0.5)
+    ...     theta = trjy.theta_wrapped             # decompressed once, then cached
+    ...     theta_strob, thetadot_strob = store.poincare(22, 1.5)
+    ...     for trjy in store.iter_trajectories(alpha=(20, 25), omega=(1, 2)):
+    ...         ...
+
+Conventions:
+- alpha and theta0 are given in DEGREES (as in the group names), omega in rad/s.
+- A parameter selection is either None (everything), a scalar (one value),
+  a 2-tuple (inclusive range) or a list/array of values.
+
+Decompressed arrays are kept in a least recently used cache bounded by
+`cache_bytes`, so repeated reads of the same dataset in a session are free.
+Cached arrays are read-only, copy them before modifying in place.
+
+A file that `param_scan` is still writing can be opened with `swmr=True`.
+Trajectories that have not been written yet are left out of the catalog; call
+`store.refresh()` to pick up the ones completed since.
+
+The catalog of a finished scan is read from the `catalog` table that
+`param_scan` writes (one row per trajectory, gamma included), so opening a
+large file and selecting e.g. several gammas does not walk every group.
+
+Plot loops can read ahead with `store.prefetch(...)`, which decodes the
+datasets of the next few trajectories on a background thread. h5py holds its
+global lock (and the GIL) for the whole of every read, decompression included,
+so the reads interleave with the rendering rather than run in parallel with it:
+expect a modest gain at best, most of the reading time stays on the critical path.
+
+    >>> for trjy in store.prefetch(alpha=22, omega=(1, 6), names=("theta",), strob=True):
+    ...     theta = trjy.strob("theta")            # already decoded, taken from the cache
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import h5py
+import storage_setup
+
+
+def wrap_theta(theta):
+    """Wraps theta to the range [-pi, pi)."""
+    return (np.asarray(theta) + np.pi) % (2*np.pi) - np.pi
+
+
+def select(values, selection, atol=1e-6):
+    """
+    Boolean mask of the entries of `values` matched by `selection`
+    (None, scalar, 2-tuple range or list of values).
+    """
+    values = np.asarray(values, dtype=float)
+    if selection is None:
+        return np.ones(values.shape, dtype=bool)
+    if isinstance(selection, tuple):
+        lo, hi = selection
+        return (values >= lo - atol) & (values <= hi + atol)
+    selection = np.atleast_1d(np.asarray(selection, dtype=float))
+    return np.any(np.abs(values[:, None] - selection[None, :]) <= atol, axis=1)
+
+
+class ArrayCache:
+    """
+    Least recently used cache of numpy arrays, bounded by total memory.
+    """
+    def __init__(self, max_bytes=512*2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, loader):
+        """Returns the cached array for key, calling loader() on a miss."""
+        if key in self._data:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+        self.misses += 1
+        array = np.asarray(loader())
+        array.setflags(write=False)
+        if array.nbytes <= self.max_bytes:
+            self._data[key] = array
+            self.nbytes += array.nbytes
+            self._evict()
+        return array
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._data:
+            _, array = self._data.popitem(last=False)
+            self.nbytes -= array.nbytes
+
+    def clear(self):
+        self._data.clear()
+        self.nbytes = 0
+
+
+class TrajectoryView:
+    """
+    Lazy handle to one trajectory group. Nothing is read until a dataset is accessed.
+    """
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self._attrs = None
+
+    def __repr__(self):
+        return f"TrajectoryView({self.path!r})"
+
+    @property
+    def group(self):
+        return self.store.file[self.path]
+
+    @property
+    def attrs(self):
+        """Attributes of the trajectory group (alpha, omega, theta0, thetadot0, gamma, ...)."""
+        if self._attrs is None:
+            self._attrs = dict(self.group.attrs)
+        return self._attrs
+
+    @property
+    def samples_per_period(self):
+        return int(self.attrs.get("samples_per_period", 64))
+
+    def is_complete(self):
+        """False if the trajectory is still to be written by a running scan."""
+        ds = self.group["theta"]
+        if self.store.swmr:
+            ds.refresh()
+        return ds.shape[0] > 0
+
+    def read(self, name, sel=slice(None)):
+        """Reads dataset `name` (optionally a slice of it) through the store cache."""
+        return self.store.cache.get(self._cache_key(name, sel), lambda: self._load(name, sel))
+
+    def _cache_key(self, name, sel):
+        return (self.path, name, sel.start, sel.stop, sel.step)
+
+    def _load(self, name, sel):
+        ds = self.group[name]
+        if self.store.swmr:
+            ds.refresh()
+            if ds.shape[0] == 0:
+                raise KeyError(f"{self.path}/{name} has not been written yet")
+        return ds[sel]
+
+    @property
+    def theta(self):
+        return self.read("theta")
+
+    @property
+    def thetadot(self):
+        return self.read("thetadot")
+
+    @property
+    def tau(self):
+        return self.read("tau")
+
+    @property
+    def theta_wrapped(self):
+        """theta in the range [-pi, pi)."""
+        return wrap_theta(self.theta)
+
+    def strob(self, name="theta"):
+        """Stroboscopic samples (one per drive period) of dataset `name`."""
+        return self.read(name, slice(None, None, self.samples_per_period))
+
+    def poincare(self, wrap=True):
+        """Stroboscopic Poincaré section (theta, thetadot)."""
+        theta = self.strob("theta")
+        return (wrap_theta(theta) if wrap else theta), self.strob("thetadot")
+
+
+def build_catalog(file, is_complete=None):
+    """
+    TrajectoryStore.catalog_dtype rows of every trajectory group of an open h5 file, from the
+    group attributes, sorted by (alpha, omega). is_complete(path): optional filter.
+    """
+    rows = list()
+    for alpha_name, alpha_grp in file.items():
+        if not alpha_name.startswith("alpha") or not isinstance(alpha_grp, h5py.Group):
+            continue
+        for omega_grp in alpha_grp.values():
+            if not isinstance(omega_grp, h5py.Group):
+                continue
+            for trjy_grp in omega_grp.values():
+                if not isinstance(trjy_grp, h5py.Group) or "theta" not in trjy_grp:
+                    continue
+                if is_complete is not None and not is_complete(trjy_grp.name):
+                    continue
+                a = trjy_grp.attrs
+                rows.append((
+                    trjy_grp.name,
+                    np.rad2deg(a["alpha"]),
+                    a["omega"],
+                    np.rad2deg(a.get("theta0", np.nan)),
+                    a.get("thetadot0", np.nan),
+                    a.get("gamma", 0.0),
+                    a.get("rotation_number", np.nan),
+                    ))
+    catalog = np.array(rows, dtype=TrajectoryStore.catalog_dtype)
+    return catalog[np.lexsort((catalog["omega"], catalog["alpha"]))]
+
+
+class TrajectoryStore:
+    """
+    Read-only access to a trajectory file, with a bounded LRU cache of decompressed arrays.
+    path: trajectory file (e.g. "Data/dissip_trajectories.h5")
+    cache_bytes: maximum memory used by cached arrays
+    swmr: open a file that is being written by param_scan in SWMR mode
+    """
+    catalog_dtype = np.dtype([
+        ("path", object),
+        ("alpha", float),  # degrees
+        ("omega", float),
+        ("theta0", float),  # degrees
+        ("thetadot0", float),
+        ("gamma", float),
+        ("rotation_number", float),  # net loops per drive period, NaN if not counted
+        ])
+
+    def __init__(self, path, cache_bytes=512*2**20, swmr=False):
+        self.file_path = path
+        self.swmr = swmr
+        if swmr:
+            self.file = h5py.File(path, "r", libver="latest", swmr=True)
+        else:
+            self.file = h5py.File(path, "r")
+        self.cache = ArrayCache(cache_bytes)
+        self._catalog = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cache.clear()
+        self.file.close()
+
+    def refresh(self):
+        """Rebuilds the catalog, picking up trajectories completed since it was built (SWMR)."""
+        self._catalog = None
+
+    def get(self, alpha, omega, ic=(30.0, 0.0), gamma=0.5):
+        """
+        Lazy view of one trajectory.
+        alpha: degrees
+        ic: initial condition (theta0 in degrees, thetadot0)
+        """
+        path = "/" + "/".join((
+            storage_setup.alpha_key(alpha),
+            storage_setup.omega_key(omega),
+            storage_setup.trajectory_key(ic[0], ic[1], gamma),
+            ))
+        if path not in self.file:
+            raise KeyError(f"No trajectory {path} in {self.file_path}")
+        return TrajectoryView(self, path)
+
+    def poincare(self, alpha, omega, ic=(30.0, 0.0), gamma=0.5, wrap=True):
+        """Stroboscopic Poincaré section (theta, thetadot) of one trajectory."""
+        return self.get(alpha, omega, ic, gamma).poincare(wrap)
+
+    def catalog(self):
+        """
+        Structured array with one row per stored trajectory, sorted by (alpha, omega).
+        Read from the "catalog" table that param_scan writes at the end of a scan, or built
+        from the group attributes when there is none (or in SWMR mode, while a scan may be running).
+        """
+        if self._catalog is None:
+            table = None if self.swmr else storage_setup.read_table(self.file, "catalog")
+            if table is not None and set(self.catalog_dtype.names) <= set(table.dtype.names):
+                catalog = np.zeros(len(table), dtype=self.catalog_dtype)
+                for name in self.catalog_dtype.names:
+                    catalog[name] = table[name]
+                self._catalog = catalog[np.lexsort((catalog["omega"], catalog["alpha"]))]
+            else:
+                is_complete = (lambda path: TrajectoryView(self, path).is_complete()) if self.swmr else None
+                self._catalog = build_catalog(self.file, is_complete)
+        return self._catalog
+
+    def find(self, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None):
+        """Catalog rows matching the parameter selections."""
+        catalog = self.catalog()
+        mask = (
+            select(catalog["alpha"], alpha)
+            & select(catalog["omega"], omega)
+            & select(catalog["theta0"], theta0)
+            & select(catalog["thetadot0"], thetadot0)
+            & select(catalog["gamma"], gamma)
+            )
+        return catalog[mask]
+
+    def iter_trajectories(self, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None):
+        """Iterates over lazy views of the matching trajectories, ordered by (alpha, omega)."""
+        for row in self.find(alpha, omega, theta0, thetadot0, gamma):
+            yield TrajectoryView(self, row["path"])
+
+    def prefetch(self, alpha=None, omega=None, theta0=None, thetadot0=None, gamma=None,
+                 names=("theta", "thetadot"), strob=False, depth=4, workers=1):
+        """
+        Like iter_trajectories, but the datasets `names` (stroboscopic samples only if
+        strob=True) of the next `depth` trajectories are read on `workers` background
+        threads while the caller works on the current one. At most `depth` trajectories
+        are decoded ahead, which bounds the extra memory. The arrays are handed over
+        through the cache, so the yielded views read them without touching the file
+        (as long as cache_bytes holds `depth` trajectories).
+        h5py serialises every read (decompression included) under its global lock and
+        does not release the GIL, so the reads only fill the gaps of the caller's work:
+        the overlap is limited, and more than one worker does not read any faster.
+        """
+        views = (TrajectoryView(self, row["path"]) for row in self.find(alpha, omega, theta0, thetadot0, gamma))
+
+        def load(view):
+            sel = slice(None, None, view.samples_per_period) if strob else slice(None)
+            return view, {view._cache_key(name, sel): view._load(name, sel) for name in names}
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for view in views:
+                    pending.append(pool.submit(load, view))
+                    if len(pending) < depth:
+                        continue
+                    yield self._deliver(pending.popleft())
+                while pending:
+                    yield self._deliver(pending.popleft())
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _deliver(self, future):
+        # The cache is only touched from the calling thread
+        view, arrays = future.result()
+        for key, array in arrays.items():
+            self.cache.get(key, lambda: array)
+        return view
+
+    def alphas(self):
+        """Distinct alpha values (degrees)."""
+        return np.unique(self.catalog()["alpha"])
+
+    def omegas(self, alpha=None):
+        """Distinct omega values, optionally for the selected alphas only."""
+        return np.unique(self.find(alpha=alpha)["omega"])
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+Monte-Carlo propagation of the measurement uncertainties into the simulations.
+
+The parameters (omega, alpha, theta0, thetadot0) of every realization are drawn
+from normal distributions around the measured values:
+- omega +- error_omega from hoop_tracking.get_angular_velocity
+- theta0 +- the calibration angle uncertainty (calibration.angle_uncertainty)
+- alpha, thetadot0 with whatever uncertainty the setup has
+The ensemble is split into chunks integrated in parallel, each chunk at once
+by `evolve_ensemble` (time_evolution.py). Every realization runs in its own
+tau = omega*t, and theta is interpolated onto a common physical time grid with
+the quintic Hermite interpolant of phase_sections.py.
+
+The result is a band of quantiles of theta(t) and of the stroboscopic
+(theta, thetadot) per drive period, together with the density of the whole
+Poincaré set. `coverage` gives the fraction of tracked samples inside the band:
+well below the band's nominal probability, the experiment/simulation mismatch
+is significant.
+
+    python uncertainty.py --omega 3.954 --omega-error 0.067 --alpha 60 --theta0 30 --theta0-error 1 \
+        --csv "Tracker - Python Implementation/output/raw_bead_data_20260317_152653A.csv"
+"""
+import argparse
+import os
+from multiprocessing import Pool
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from time_evolution import evolve_ensemble
+from phase_sections import derivatives, quintic_hermite
+from density_plot import DensityHistogram
+from trajectory_store import wrap_theta
+
+g = 9.8
+R = 0.355/2
+plots_dir = "Plots/uncertainty/"
+
+sample_dtype = np.dtype([("omega", "f8"), ("alpha", "f8"), ("theta0", "f8"), ("thetadot0", "f8")])
+
+
+def sample_parameters(n, omega, alpha, theta0, thetadot0=0.0, error_omega=0.0, error_alpha=0.0,
+                      error_theta0=0.0, error_thetadot0=0.0, seed=None):
+    """
+    n normally distributed parameter sets (angles in radians, thetadot0 in units of omega)
+    as a structured array of sample_dtype.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.empty(n, dtype=sample_dtype)
+    for name, mean, error in (("omega", omega, error_omega), ("alpha", alpha, error_alpha),
+                              ("theta0", theta0, error_theta0), ("thetadot0", thetadot0, error_thetadot0)):
+        samples[name] = mean + error*rng.standard_normal(n)
+    return samples
+
+
+def run_chunk(samples, gamma, t, n_periods, steps_per_period, samples_per_period, g, R):
+    """
+    Integrates one chunk of realizations. Returns theta on the time grid t, shape (n, len(t)),
+    and the stroboscopic theta and thetadot, shape (n, n_periods).
+    """
+    omega = samples["omega"]
+    A = g/(R*omega**2)
+    B = gamma/omega
+    tau_fin = max(t[-1]*omega.max(), n_periods*2*np.pi)
+
+    theta_samples = list()
+    thetadot_samples = list()
+
+    def record(tau, theta, thetadot):
+        theta_samples.append(theta.copy())
+        thetadot_samples.append(thetadot.copy())
+
+    evolve_ensemble(samples["theta0"], samples["thetadot0"], tau_fin, samples["alpha"], A, B,
+                    steps_per_period=steps_per_period, samples_per_period=samples_per_period, callback=record)
+    theta_samples = np.array(theta_samples)
+    thetadot_samples = np.array(thetadot_samples)
+
+    # Each realization at its own tau = omega*t
+    h = 2*np.pi/samples_per_period
+    tau = h*np.arange(len(theta_samples))[:, None]
+    thetaddot, _ = derivatives(tau, theta_samples, thetadot_samples, samples["alpha"], A, B)
+    position = t[None, :]*omega[:, None]/h
+    i = np.clip(np.floor(position).astype(int), 0, len(theta_samples) - 2)
+    s = position - i
+    column = np.arange(len(samples))[:, None]
+    theta_t = quintic_hermite(
+            s, h,
+            theta_samples[i, column], thetadot_samples[i, column], thetaddot[i, column],
+            theta_samples[i + 1, column], thetadot_samples[i + 1, column], thetaddot[i + 1, column],
+            )
+
+    strob = slice(0, n_periods*samples_per_period, samples_per_period)
+    return theta_t, theta_samples[strob].T, thetadot_samples[strob].T
+
+
+def _run_chunk(args):
+    return run_chunk(*args)
+
+
+def propagate(samples, t, gamma=0.5, n_periods=200, discard_periods=50, quantiles=(0.025, 0.5, 0.975),
+              steps_per_period=256, samples_per_period=64, processes=None, chunk_size=256,
+              thetadot_range=(-5, 5), bins=(720, 500), g=g, R=R):
+    """
+    Integrates every parameter set of `samples` (sample_dtype) and returns a dictionary with
+    "t": the time grid (sec) and "theta": quantiles of theta(t), shape (len(quantiles), len(t))
+    "strob_theta", "strob_thetadot": quantiles of the stroboscopic points per drive period,
+        shape (len(quantiles), n_periods)
+    "density": DensityHistogram of the Poincaré set (theta wrapped, thetadot) after discard_periods
+    "quantiles", "samples"
+    theta is not wrapped, so its band is meaningful for oscillating (not looping) motion.
+    """
+    t = np.asarray(t, dtype=float)
+    chunks = [(chunk, gamma, t, n_periods, steps_per_period, samples_per_period, g, R)
+              for chunk in np.array_split(samples, max(1, -(-len(samples)//chunk_size)))]
+
+    pool = Pool(processes=processes or max(os.cpu_count(), 1))
+    try:
+        results = pool.map(_run_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+
+    theta_t = np.concatenate([result[0] for result in results])
+    strob_theta = np.concatenate([result[1] for result in results])
+    strob_thetadot = np.concatenate([result[2] for result in results])
+
+    density = DensityHistogram(x_range=(-np.pi, np.pi), y_range=thetadot_range, bins=bins)
+    density.add(wrap_theta(strob_theta[:, discard_periods:]).ravel(), strob_thetadot[:, discard_periods:].ravel())
+    return {
+        "t": t,
+        "theta": np.quantile(theta_t, quantiles, axis=0),
+        "strob_theta": np.quantile(strob_theta, quantiles, axis=0),
+        "strob_thetadot": np.quantile(strob_thetadot, quantiles, axis=0),
+        "density": density,
+        "quantiles": np.asarray(quantiles),
+        "samples": samples,
+        }
+
+
+def coverage(bands, t, theta):
+    """Fraction of the tracked samples (t, theta) within the outermost quantiles of bands["theta"]."""
+    low = np.interp(t, bands["t"], bands["theta"][0])
+    high = np.interp(t, bands["t"], bands["theta"][-1])
+    return float(np.mean((theta >= low) & (theta <= high)))
+
+
+def plot_bands(bands, t_data=None, theta_data=None, title="", file_name=None):
+    fig, (ax_theta, ax_density) = plt.subplots(1, 2, figsize=(16, 6), width_ratios=(2, 1))
+    q = bands["quantiles"]
+    ax_theta.fill_between(bands["t"], bands["theta"][0], bands["theta"][-1], color="red", alpha=0.3,
+                          label=f"{100*q[0]:g}-{100*q[-1]:g}% band")
+    if len(q) > 2:
+        ax_theta.plot(bands["t"], bands["theta"][len(q)//2], color="red", lw=0.8, label=f"{100*q[len(q)//2]:g}%")
+    if t_data is not None:
+        ax_theta.plot(t_data, theta_data, ".", color="black", markersize=1,
+                      label=f"Tracked ({100*coverage(bands, t_data, theta_data):.1f}% inside)")
+    ax_theta.set_xlabel(r"$t\;(s)$")
+    ax_theta.set_ylabel(r"$\theta\;(rad)$")
+    ax_theta.legend()
+    ax_theta.grid(True, linestyle="--", alpha=0.7)
+
+    bands["density"].plot(ax=ax_density, log=True, cmap="Greys")
+    ax_density.set_xlabel(r"$\theta\;(rad)$")
+    ax_density.set_ylabel(r"$\dot\theta$")
+    ax_density.set_title("Poincaré set of the ensemble")
+    fig.suptitle(title)
+    if file_name:
+        fig.savefig(file_name, bbox_inches="tight", pad_inches=0.2)
+        print(file_name)
+    else:
+        plt.show()
+    plt.close(fig)
+
+
+def read_angular_velocity_file(path):
+    """
+    (mean_omega, error_omega) from the tracker's angular_velocity_*.txt, either
+    "Angular Velocity : x" and "Error : y" lines or "... Angular Velocity (rad/s): x ± y".
+    """
+    omega = error = None
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.rpartition(":")
+            if "Angular Velocity" in key:
+                omega, _, spread = value.partition("±")
+                omega = float(omega)
+                error = float(spread) if spread.strip() else error
+            elif "Error" in key:
+                error = float(value)
+    return omega, error
+
+
+if __name__ == "__main__":
+    from experiment_overlay import load_tracker_csv, initial_conditions
+
+    parser = argparse.ArgumentParser(description="Propagate the measurement uncertainties into the simulation.")
+    omega_source = parser.add_mutually_exclusive_group(required=True)
+    omega_source.add_argument("--omega", type=float)
+    omega_source.add_argument("--omega-file", help="Tracker angular_velocity_*.txt")
+    parser.add_argument("--omega-error", type=float, default=0.0)
+    parser.add_argument("--alpha", type=float, required=True, help="degrees")
+    parser.add_argument("--alpha-error", type=float, default=0.0, help="degrees")
+    parser.add_argument("--theta0", type=float, default=30.0, help="degrees, the first tracked sample with --csv")
+    parser.add_argument("--theta0-error", type=float, default=0.0, help="degrees, see calibration.angle_uncertainty")
+    parser.add_argument("--thetadot0", type=float, default=0.0, help="rad/s, from the first tracked samples with --csv")
+    parser.add_argument("--thetadot0-error", type=float, default=0.0, help="rad/s")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--csv", help="Tracker CSV export to compare with")
+    parser.add_argument("--duration", type=float, default=60.0, help="sec, without --csv")
+    parser.add_argument("--periods", type=int, default=200, help="Drive periods of the Poincaré set")
+    parser.add_argument("--discard", type=int, default=50, help="Transient drive periods")
+    parser.add_argument("--realizations", type=int, default=1024)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.omega_file:
+        omega, omega_error = read_angular_velocity_file(args.omega_file)
+    else:
+        omega, omega_error = args.omega, args.omega_error
+
+    t_data = theta_data = None
+    theta0, thetadot0 = np.deg2rad(args.theta0), args.thetadot0
+    if args.csv:
+        t_data, theta_data = load_tracker_csv(args.csv)
+        theta0, thetadot0 = initial_conditions(t_data, theta_data)
+        t_data = t_data - t_data[0]
+        t = t_data
+    else:
+        t = np.linspace(0, args.duration, int(args.duration*50) + 1)
+
+    # thetadot0 in rad/s -> d theta/d tau
+    samples = sample_parameters(
+            args.realizations, omega, np.deg2rad(args.alpha), theta0, thetadot0/omega,
+            error_omega=omega_error, error_alpha=np.deg2rad(args.alpha_error),
+            error_theta0=np.deg2rad(args.theta0_error), error_thetadot0=args.thetadot0_error/omega, seed=args.seed,
+            )
+
+    matplotlib.use("Agg")
+    bands = propagate(samples, t, args.gamma, n_periods=args.discard + args.periods, discard_periods=args.discard,
+                      processes=args.processes)
+    if t_data is not None:
+        print(f"Tracked samples inside the band: {100*coverage(bands, t_data, theta_data):.1f}%")
+
+    os.makedirs(plots_dir, exist_ok=True)
+    plot_bands(
+            bands, t_data, theta_data,
+            title=rf"$\omega={omega:.3f}\pm{omega_error:.3f}\quad \alpha=({args.alpha:.2f}\pm{args.alpha_error:.2f})^\circ"
+                  rf"\quad \gamma={args.gamma}\quad N={args.realizations}$",
+            file_name=f"{plots_dir}{omega:06.3f}_{args.alpha:05.2f}_{args.gamma}.jpg",
+            )